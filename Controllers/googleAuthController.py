@@ -4,10 +4,12 @@ from extensions import limiter
 import requests
 import jwt
 import os
-from datetime import datetime, timedelta
 from dotenv import load_dotenv
 from Workers.userWorker import UserWorker
-from Repositories.userRepository import UserRepository
+from Repositories.userRepository import UserRepository, DuplicateUserError
+from Utils import http_client
+from Utils.auth import create_tokens
+from Utils.google_id_token import verify_id_token
 import secrets
 
 load_dotenv()
@@ -19,13 +21,31 @@ user_repo = UserRepository()
 GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")
 GOOGLE_CLIENT_SECRET = os.getenv("GOOGLE_CLIENT_SECRET")
 GOOGLE_REDIRECT_URI = os.getenv("GOOGLE_REDIRECT_URI", "https://pygre.onrender.com/auth/google/callback")
-SECRET_KEY = os.getenv("SECRET_KEY")
 
 GOOGLE_AUTH_URL = "https://accounts.google.com/o/oauth2/v2/auth"
 GOOGLE_TOKEN_URL = "https://oauth2.googleapis.com/token"
 GOOGLE_USERINFO_URL = "https://www.googleapis.com/oauth2/v2/userinfo"
 
 
+def _find_or_create_user(email, name, picture):
+    user = user_repo.find_by_email(email)
+    if user:
+        return user
+
+    base_username = name.lower().replace(" ", "_") if name else email.split("@")[0]
+    random_password = secrets.token_urlsafe(32)
+
+    try:
+        user = user_repo.create_with_available_username(base_username, email, random_password)
+    except DuplicateUserError:
+        # Login simultâneo com o mesmo e-mail criou a conta primeiro
+        return user_repo.find_by_email(email)
+
+    if user and picture:
+        user_repo.update_foto(user.id, picture)
+    return user
+
+
 @google_auth_bp.route("/auth/google", methods=["GET"])
 @cross_origin()
 def google_login():
@@ -71,14 +91,14 @@ def google_callback():
             "grant_type": "authorization_code"
         }
         
-        token_response = requests.post(GOOGLE_TOKEN_URL, data=token_data)
+        token_response = http_client.post(GOOGLE_TOKEN_URL, data=token_data)
         token_response.raise_for_status()
         tokens = token_response.json()
         
         access_token = tokens.get("access_token")
         
         headers = {"Authorization": f"Bearer {access_token}"}
-        userinfo_response = requests.get(GOOGLE_USERINFO_URL, headers=headers)
+        userinfo_response = http_client.get(GOOGLE_USERINFO_URL, headers=headers)
         userinfo_response.raise_for_status()
         user_info = userinfo_response.json()
         
@@ -90,43 +110,11 @@ def google_callback():
         if not email:
             return redirect("https://mylinks-352x.onrender.com/login.html?error=no_email")
         
-        user = user_repo.find_by_email(email)
-        
+        user = _find_or_create_user(email, name, picture)
         if not user:
-            base_username = name.lower().replace(" ", "_") if name else email.split("@")[0]
-            username = base_username
-            counter = 1
-            
-            while user_repo.find_by_username(username):
-                username = f"{base_username}{counter}"
-                counter += 1
-            
-            random_password = secrets.token_urlsafe(32)
-            
-            user = user_repo.create(username, email, random_password)
-            
-            if picture:
-                user_repo.update_foto(user.id, picture)
-        
-        access_token_jwt = jwt.encode(
-            {
-                "id": user.id,
-                "exp": datetime.utcnow() + timedelta(minutes=15),
-                "type": "access"
-            },
-            SECRET_KEY,
-            algorithm="HS256"
-        )
+            return redirect("https://mylinks-352x.onrender.com/login.html?error=server_error")
         
-        refresh_token_jwt = jwt.encode(
-            {
-                "id": user.id,
-                "exp": datetime.utcnow() + timedelta(days=7),
-                "type": "refresh"
-            },
-            SECRET_KEY,
-            algorithm="HS256"
-        )
+        access_token_jwt, refresh_token_jwt = create_tokens(user.id)
         
         redirect_url = (
             f"https://mylinks-352x.onrender.com/login.html?"
@@ -161,14 +149,8 @@ def google_login_mobile():
     id_token = data["id_token"]
     
     try:
-        response = requests.get(
-            f"https://oauth2.googleapis.com/tokeninfo?id_token={id_token}"
-        )
-        response.raise_for_status()
-        token_info = response.json()
-        
-        if token_info.get("aud") != GOOGLE_CLIENT_ID:
-            return jsonify({"error": "Token inválido"}), 401
+        # Assinatura, aud, iss e exp conferidos localmente com as chaves públicas (JWKS) em cache
+        token_info = verify_id_token(id_token, GOOGLE_CLIENT_ID)
         
         google_id = token_info.get("sub")
         email = token_info.get("email")
@@ -178,42 +160,11 @@ def google_login_mobile():
         if not email:
             return jsonify({"error": "Email não encontrado no token"}), 400
         
-        user = user_repo.find_by_email(email)
-        
+        user = _find_or_create_user(email, name, picture)
         if not user:
-            base_username = name.lower().replace(" ", "_") if name else email.split("@")[0]
-            username = base_username
-            counter = 1
-            
-            while user_repo.find_by_username(username):
-                username = f"{base_username}{counter}"
-                counter += 1
-            
-            random_password = secrets.token_urlsafe(32)
-            user = user_repo.create(username, email, random_password)
-            
-            if picture:
-                user_repo.update_foto(user.id, picture)
-        
-        access_token_jwt = jwt.encode(
-            {
-                "id": user.id,
-                "exp": datetime.utcnow() + timedelta(minutes=15),
-                "type": "access"
-            },
-            SECRET_KEY,
-            algorithm="HS256"
-        )
+            return jsonify({"error": "Erro ao criar usuário"}), 500
         
-        refresh_token_jwt = jwt.encode(
-            {
-                "id": user.id,
-                "exp": datetime.utcnow() + timedelta(days=7),
-                "type": "refresh"
-            },
-            SECRET_KEY,
-            algorithm="HS256"
-        )
+        access_token_jwt, refresh_token_jwt = create_tokens(user.id)
         
         return jsonify({
             "access_token": access_token_jwt,
@@ -226,8 +177,12 @@ def google_login_mobile():
             }
         }), 200
         
+    except jwt.InvalidTokenError as e:
+        print(f"Token do Google rejeitado: {e}")
+        return jsonify({"error": "Token inválido"}), 401
+    
     except requests.exceptions.RequestException as e:
-        print(f"Erro ao validar token do Google: {e}")
+        print(f"Erro ao buscar chaves do Google: {e}")
         return jsonify({"error": "Erro ao validar token"}), 500
     
     except Exception as e:
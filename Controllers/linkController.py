@@ -1,18 +1,44 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, redirect, Response, stream_with_context
+import codecs
+import io
 from extensions import limiter
 from Workers.linkWorker import LinkWorker
+from Workers.clickWorker import ClickWorker
 from Utils.auth import token_required
+from Utils.http_cache import make_etag, is_not_modified, not_modified_response, etag_response, PRIVATE_CACHE_CONTROL
 
 link_bp = Blueprint("links", __name__)
 worker = LinkWorker()
+click_worker = ClickWorker()
 
 @link_bp.route("/links", methods=["GET"])
 @token_required
 def get_links(usuario_id):
-    result = worker.getAll(usuario_id)
+    # Só a revalidação consulta a versão antes; sem If-None-Match ela vem junto com os links
+    if request.if_none_match:
+        versao = worker.get_version(usuario_id)
+        if versao is not None:
+            etag = make_etag(usuario_id, versao)
+            if is_not_modified(etag):
+                return not_modified_response(etag, PRIVATE_CACHE_CONTROL)
+
+    paginado = "limit" in request.args or "cursor" in request.args
+    if paginado:
+        limit = request.args.get("limit", type=int)
+        if "limit" in request.args and limit is None:
+            return jsonify({"error": "limit inválido"}), 400
+        result = worker.get_page(usuario_id, limit, request.args.get("cursor"))
+    else:
+        result = worker.getAll(usuario_id)
+
     if isinstance(result, tuple):
         return jsonify(result[0]), result[1]
-    return jsonify(result), 200
+
+    versao = result.pop("versao")
+    body = result if paginado else result["links"]
+    if versao is not None:
+        return etag_response(body, make_etag(usuario_id, versao), PRIVATE_CACHE_CONTROL), 200
+    return jsonify(body), 200
 
 @link_bp.route("/links", methods=["POST"])
 @token_required
@@ -33,6 +59,74 @@ def create_link(usuario_id):
         return jsonify(result[0]), result[1]
     return jsonify(result), 200
 
+@link_bp.route("/links/batch", methods=["POST"])
+@token_required
+@limiter.limit("5 per minute")
+def batch_links(usuario_id):
+    data = request.get_json()
+    if not data:
+        return jsonify({"error": "Body inválido"}), 400
+
+    result = worker.batch(usuario_id, data)
+    if isinstance(result, tuple):
+        return jsonify(result[0]), result[1]
+    return jsonify(result), 200
+
+@link_bp.route("/links/export", methods=["GET"])
+@token_required
+@limiter.limit("5 per minute")
+def export_links(usuario_id):
+    result = worker.export(usuario_id, request.args.get("format", "ndjson"))
+    if isinstance(result, tuple):
+        return jsonify(result[0]), result[1]
+
+    return Response(
+        stream_with_context(result["linhas"]),
+        mimetype=result["mimetype"],
+        headers={"Content-Disposition": f"attachment; filename={result['arquivo']}"}
+    )
+
+@link_bp.route("/links/import", methods=["POST"])
+@token_required
+@limiter.limit("5 per minute")
+def import_links(usuario_id):
+    stream = request.files["file"].stream if "file" in request.files else request.stream
+    if isinstance(stream, io.RawIOBase):
+        stream = io.BufferedReader(stream)
+
+    formato = request.args.get("format", "csv" if request.mimetype == "text/csv" else "ndjson")
+    result = worker.import_links(usuario_id, formato, codecs.iterdecode(stream, "utf-8-sig"))
+    if isinstance(result, tuple):
+        return jsonify(result[0]), result[1]
+    return jsonify(result), 200
+
+@link_bp.route("/links/stats", methods=["GET"])
+@token_required
+def profile_stats(usuario_id):
+    result = click_worker.stats(
+        usuario_id,
+        request.args.get("from"),
+        request.args.get("to"),
+        request.args.get("granularity", "day")
+    )
+    if isinstance(result, tuple):
+        return jsonify(result[0]), result[1]
+    return jsonify(result), 200
+
+@link_bp.route("/links/<int:id>/stats", methods=["GET"])
+@token_required
+def link_stats(usuario_id, id):
+    result = click_worker.stats(
+        usuario_id,
+        request.args.get("from"),
+        request.args.get("to"),
+        request.args.get("granularity", "day"),
+        link_id=id
+    )
+    if isinstance(result, tuple):
+        return jsonify(result[0]), result[1]
+    return jsonify(result), 200
+
 @link_bp.route("/links/<int:id>", methods=["PUT"])
 @token_required
 @limiter.limit("5 per minute")
@@ -61,6 +155,19 @@ def delete_link(usuario_id, id):
         return jsonify(result[0]), result[1]
     return jsonify(result), 200
 
+@link_bp.route("/links/<int:id>/move", methods=["PATCH"])
+@token_required
+@limiter.limit("30 per minute")
+def move_link(usuario_id, id):
+    data = request.get_json()
+    if not isinstance(data, dict):
+        return jsonify({"error": "Body inválido"}), 400
+
+    result = worker.move(usuario_id, id, data.get("before"), data.get("after"))
+    if isinstance(result, tuple):
+        return jsonify(result[0]), result[1]
+    return jsonify(result), 200
+
 @link_bp.route("/links/reorder", methods=["PUT"])
 @token_required
 @limiter.limit("5 per minute")
@@ -74,3 +181,10 @@ def reorder_links(usuario_id):
         return jsonify(result[0]), result[1]
 
     return jsonify(result), 200
+
+@link_bp.route("/l/<int:link_id>", methods=["GET"])
+def redirect_link(link_id):
+    result = click_worker.register_click(link_id)
+    if isinstance(result, tuple):
+        return jsonify(result[0]), result[1]
+    return redirect(result["url"])
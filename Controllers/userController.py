@@ -1,20 +1,24 @@
-from flask import Blueprint, request, jsonify, redirect
+from flask import Blueprint, request, jsonify, redirect, g
 from flask_cors import cross_origin
 from extensions import limiter
+from flask_limiter.util import get_remote_address
 import cloudinary
 import cloudinary.uploader
 import jwt
-from datetime import datetime, timedelta
+from datetime import timedelta
 from Workers.userWorker import UserWorker
-from Utils.auth import token_required
+from Workers.visitorWorker import VisitorWorker
+from Utils.auth import token_required, decode_token, create_token, revoke_token
 from Utils.cloudinary import configure_cloudinary
-import os
+from Utils.http_cache import make_etag, is_not_modified, not_modified_response, etag_response, PUBLIC_CACHE_CONTROL
+from Utils.shard_router import UserMovingError
 from dotenv import load_dotenv
 
 load_dotenv()
 
 user_bp = Blueprint("usuario", __name__)
 worker = UserWorker()
+visitor_worker = VisitorWorker()
 
 configure_cloudinary()
 
@@ -67,16 +71,12 @@ def refresh_token():
     token = auth_header.split(" ")[1] if " " in auth_header else auth_header
 
     try:
-        decoded = jwt.decode(token, os.getenv("SECRET_KEY"), algorithms=["HS256"])
+        decoded = decode_token(token)
 
         if decoded.get("type") != "refresh":
             return jsonify({"error": "Token inválido para refresh"}), 401
 
-        new_access_token = jwt.encode(
-            {"id": decoded["id"], "exp": datetime.utcnow() + timedelta(hours=1), "type": "access"},
-            os.getenv("SECRET_KEY"),
-            algorithm="HS256"
-        )
+        new_access_token = create_token(decoded["id"], "access", timedelta(hours=1))
 
         return jsonify({"access_token": new_access_token}), 200
 
@@ -85,10 +85,53 @@ def refresh_token():
     except jwt.InvalidTokenError:
         return jsonify({"error": "Token inválido"}), 401
 
+@user_bp.route("/auth/logout", methods=["POST"])
+@cross_origin()
+@token_required
+def logout(usuario_id):
+    revoke_token(g.token)
+
+    # O refresh token da mesma sessão é opcional, mas sem ele a sessão pode ser renovada
+    data = request.get_json(silent=True) or {}
+    refresh_token = data.get("refresh_token")
+    if refresh_token:
+        try:
+            decoded = decode_token(refresh_token)
+        except jwt.InvalidTokenError:
+            return jsonify({"error": "Refresh token inválido"}), 400
+
+        if decoded.get("type") != "refresh" or decoded["id"] != usuario_id:
+            return jsonify({"error": "Refresh token inválido"}), 400
+        revoke_token(decoded)
+
+    return jsonify({"message": "Logout realizado com sucesso"}), 200
+
 @user_bp.route("/user/<string:username>", methods=["GET"])
 @cross_origin()
 def public_profile(username):
+    visitante = f"{get_remote_address()}|{request.user_agent.string}"
+
+    if request.if_none_match:
+        version = worker.get_profile_version(username)
+        if version:
+            etag = make_etag(version["id"], version["versao"])
+            if is_not_modified(etag):
+                visitor_worker.record(version["id"], visitante)
+                return not_modified_response(etag, PUBLIC_CACHE_CONTROL)
+
     result = worker.get_public_profile(username)
+    if isinstance(result, tuple):
+        return jsonify(result[0]), result[1]
+
+    visitor_worker.record(result["id"], visitante)
+    profile = dict(result)
+    etag = make_etag(profile["id"], profile.pop("versao"))
+    return etag_response(profile, etag, PUBLIC_CACHE_CONTROL), 200
+
+@user_bp.route("/auth/visitors", methods=["GET"])
+@token_required
+def visitors(usuario_id):
+    result = visitor_worker.visitors(usuario_id, request.args.get("from"), request.args.get("to"))
     if isinstance(result, tuple):
         return jsonify(result[0]), result[1]
     return jsonify(result), 200
@@ -137,6 +180,8 @@ def upload_foto(usuario_id):
             return jsonify(result[0]), result[1]
         return jsonify(result), 200
         
+    except UserMovingError:
+        raise
     except Exception as e:
         print("Erro no upload:", e)
         return jsonify({"error": "Falha ao enviar imagem"}), 500
@@ -0,0 +1,155 @@
+from Utils.storage import Error, SQLITE, get_db_cursor
+from Utils.shard_router import router
+import logging
+
+logging.basicConfig(level=logging.ERROR)
+
+if SQLITE:
+    # OR IGNORE não cobre chaves estrangeiras no SQLite: o EXISTS descarta cliques de links removidos
+    INCREMENT_TOTAL_SQL = (
+        "INSERT INTO link_cliques (link_id, total) "
+        "SELECT v.link_id, v.total FROM (SELECT %s AS link_id, %s AS total) AS v "
+        "WHERE EXISTS (SELECT 1 FROM links WHERE id = v.link_id) "
+        "ON CONFLICT (link_id) DO UPDATE SET total = total + excluded.total"
+    )
+    INCREMENT_HOUR_SQL = (
+        "INSERT INTO link_cliques_hora (link_id, usuario_id, hora, total) "
+        "SELECT v.link_id, v.usuario_id, v.hora, v.total "
+        "FROM (SELECT %s AS link_id, %s AS usuario_id, %s AS hora, %s AS total) AS v "
+        "WHERE EXISTS (SELECT 1 FROM links WHERE id = v.link_id) "
+        "ON CONFLICT (link_id, hora) DO UPDATE SET total = total + excluded.total"
+    )
+    COMPACT_SQL = (
+        "INSERT INTO link_cliques_dia (link_id, usuario_id, dia, total) "
+        "SELECT link_id, usuario_id, DATE(hora), SUM(total) FROM link_cliques_hora "
+        "WHERE hora < %s GROUP BY link_id, usuario_id, DATE(hora) "
+        "ON CONFLICT (link_id, dia) DO UPDATE SET total = total + excluded.total"
+    )
+    # Tipos das colunas calculadas, para o sqlite3 devolver date/datetime como o MySQL
+    PERIODO_HORA, PERIODO_DIA = '"periodo [DATETIME]"', '"periodo [DATE]"'
+else:
+    # IGNORE descarta cliques de links removidos antes do flush (falha de chave estrangeira)
+    INCREMENT_TOTAL_SQL = (
+        "INSERT IGNORE INTO link_cliques (link_id, total) VALUES (%s, %s) "
+        "ON DUPLICATE KEY UPDATE total = total + VALUES(total)"
+    )
+    INCREMENT_HOUR_SQL = (
+        "INSERT IGNORE INTO link_cliques_hora (link_id, usuario_id, hora, total) VALUES (%s, %s, %s, %s) "
+        "ON DUPLICATE KEY UPDATE total = total + VALUES(total)"
+    )
+    COMPACT_SQL = (
+        "INSERT INTO link_cliques_dia (link_id, usuario_id, dia, total) "
+        "SELECT link_id, usuario_id, DATE(hora), SUM(total) FROM link_cliques_hora "
+        "WHERE hora < %s GROUP BY link_id, usuario_id, DATE(hora) "
+        "ON DUPLICATE KEY UPDATE total = total + VALUES(total)"
+    )
+    PERIODO_HORA = PERIODO_DIA = "periodo"
+
+class ClickRepository:
+    def increment_many(self, contagens):
+        """Grava os cliques e devolve os que ficaram pendentes (shard com erro ou usuário em migração)."""
+        try:
+            shards = router.shards_for_write(usuario_id for _, usuario_id, _ in contagens)
+        except Error as e:
+            logging.error(f"Erro ao tentar localizar os shards dos cliques: {e}")
+            return contagens
+
+        pendentes = {}
+        por_shard = {}
+        for chave, quantidade in contagens.items():
+            if chave[1] in shards:
+                por_shard.setdefault(shards[chave[1]], {})[chave] = quantidade
+            else:
+                pendentes[chave] = quantidade
+
+        for shard, lote in por_shard.items():
+            if not self._increment_shard(shard, lote):
+                pendentes.update(lote)
+        return pendentes
+
+    def _increment_shard(self, shard, contagens):
+        totais = {}
+        for (link_id, _, _), quantidade in contagens.items():
+            totais[link_id] = totais.get(link_id, 0) + quantidade
+
+        try:
+            with get_db_cursor(shard=shard) as cursor:
+                cursor.executemany(INCREMENT_TOTAL_SQL, list(totais.items()))
+                cursor.executemany(
+                    INCREMENT_HOUR_SQL,
+                    [(link_id, usuario_id, hora, quantidade) for (link_id, usuario_id, hora), quantidade in contagens.items()]
+                )
+
+                return True
+
+        except Error as e:
+            logging.error(f"Erro ao tentar gravar cliques: {e}")
+            return False
+
+    def compact(self, antes_de):
+        compactadas = [self._compact_shard(shard, antes_de) for shard in router.shards]
+        if all(total is None for total in compactadas):
+            return None
+        return sum(total or 0 for total in compactadas)
+
+    def _compact_shard(self, shard, antes_de):
+        try:
+            with get_db_cursor(shard=shard) as cursor:
+                # No SQLite a transação de escrita já é exclusiva: quem chega depois não acha o que compactar
+                if SQLITE:
+                    return self._compact_hours(cursor, antes_de)
+
+                # Apenas um processo compacta por vez; os demais pulam esta rodada
+                cursor.execute("SELECT GET_LOCK('mylinks_compactacao_cliques', 0) AS obtido")
+                if not cursor.fetchone()["obtido"]:
+                    return 0
+
+                try:
+                    return self._compact_hours(cursor, antes_de)
+                finally:
+                    cursor.execute("SELECT RELEASE_LOCK('mylinks_compactacao_cliques')")
+                    cursor.fetchall()
+
+        except Error as e:
+            logging.error(f"Erro ao tentar compactar cliques por hora: {e}")
+            return None
+
+    def _compact_hours(self, cursor, antes_de):
+        cursor.execute(COMPACT_SQL, (antes_de,))
+        cursor.execute(
+            "DELETE FROM link_cliques_hora WHERE hora < %s",
+            (antes_de,)
+        )
+        return cursor.rowcount
+
+    def get_series(self, usuario_id, inicio, fim, granularidade, link_id=None):
+        filtro = "usuario_id = %s"
+        params = [usuario_id]
+        if link_id is not None:
+            filtro += " AND link_id = %s"
+            params.append(link_id)
+
+        try:
+            with get_db_cursor(shard=router.shard_for_user(usuario_id)) as cursor:
+                if granularidade == "hour":
+                    cursor.execute(
+                        f"SELECT hora AS {PERIODO_HORA}, SUM(total) AS cliques FROM link_cliques_hora "
+                        f"WHERE {filtro} AND hora >= %s AND hora < %s GROUP BY hora ORDER BY hora",
+                        (*params, inicio, fim)
+                    )
+                else:
+                    # Dias recentes ainda estão nos baldes por hora até a compactação
+                    cursor.execute(
+                        f"SELECT dia AS {PERIODO_DIA}, SUM(total) AS cliques FROM ("
+                        f"SELECT dia, total FROM link_cliques_dia WHERE {filtro} AND dia >= %s AND dia < %s "
+                        "UNION ALL "
+                        f"SELECT DATE(hora) AS dia, total FROM link_cliques_hora WHERE {filtro} AND hora >= %s AND hora < %s"
+                        ") AS baldes GROUP BY dia ORDER BY dia",
+                        (*params, inicio.date(), fim.date(), *params, inicio, fim)
+                    )
+
+                return cursor.fetchall()
+
+        except Error as e:
+            logging.error(f"Erro ao tentar buscar estatísticas de cliques: {e}")
+            return None
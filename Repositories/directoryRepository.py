@@ -0,0 +1,76 @@
+from Utils.storage import get_db_cursor, replica_read
+
+# Diretório de usuários (banco de CONN_URL): dono de cada id, username e e-mail e o shard onde ele mora.
+# Os erros do MySQL sobem para o chamador: estas consultas fazem parte de cadastros e alterações maiores
+class DirectoryRepository:
+    def insert(self, username, email, shard):
+        with get_db_cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO usuarios_diretorio (username, email, shard) VALUES (%s, %s, %s)",
+                (username, email, shard)
+            )
+            return cursor.lastrowid
+
+    def get(self, usuario_id):
+        def fetch(cursor):
+            cursor.execute(
+                "SELECT id, shard, movendo FROM usuarios_diretorio WHERE id = %s",
+                (usuario_id,)
+            )
+            return cursor.fetchone()
+
+        return replica_read(fetch, owner=lambda row: row["id"])
+
+    def get_for_write(self, usuario_id):
+        with get_db_cursor() as cursor:
+            # Trava compartilhada até o fim da transação: a migração (movendo = 1) espera as escritas em curso
+            cursor.execute(
+                "SELECT id, shard, movendo FROM usuarios_diretorio WHERE id = %s LOCK IN SHARE MODE",
+                (usuario_id,)
+            )
+            return cursor.fetchone()
+
+    def get_many_for_write(self, usuario_ids):
+        marcadores = ", ".join(["%s"] * len(usuario_ids))
+        with get_db_cursor() as cursor:
+            cursor.execute(
+                f"SELECT id, shard, movendo FROM usuarios_diretorio WHERE id IN ({marcadores}) LOCK IN SHARE MODE",
+                list(usuario_ids)
+            )
+            return cursor.fetchall()
+
+    def find(self, campo, valor):
+        def fetch(cursor):
+            cursor.execute(
+                f"SELECT id, shard FROM usuarios_diretorio WHERE {campo} = %s",
+                (valor,)
+            )
+            return cursor.fetchone()
+
+        return replica_read(fetch, owner=lambda row: row["id"])
+
+    def update(self, usuario_id, campo, valor):
+        with get_db_cursor() as cursor:
+            cursor.execute(
+                f"UPDATE usuarios_diretorio SET {campo} = %s WHERE id = %s",
+                (valor, usuario_id)
+            )
+
+    def delete(self, usuario_id):
+        with get_db_cursor() as cursor:
+            cursor.execute("DELETE FROM usuarios_diretorio WHERE id = %s", (usuario_id,))
+
+    def begin_move(self, usuario_id, origem):
+        with get_db_cursor() as cursor:
+            cursor.execute(
+                "UPDATE usuarios_diretorio SET movendo = 1 WHERE id = %s AND shard = %s AND movendo = 0",
+                (usuario_id, origem)
+            )
+            return cursor.rowcount > 0
+
+    def finish_move(self, usuario_id, shard):
+        with get_db_cursor() as cursor:
+            cursor.execute(
+                "UPDATE usuarios_diretorio SET shard = %s, movendo = 0 WHERE id = %s",
+                (shard, usuario_id)
+            )
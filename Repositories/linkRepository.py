@@ -1,44 +1,115 @@
-from Utils.db_railway import get_db_cursor
-from mysql.connector import Error
+from Utils.storage import Error, SQLITE, get_db_cursor, get_read_cursor, replica_read, on_commit, mark_written
+from Utils.shard_router import router
+from Utils.cache import profile_cache, link_cache, mark_changed
 from Models.link import Link
 import logging
 
 logging.basicConfig(level=logging.ERROR)
 
+REORDER_BATCH_SIZE = 500
+EXPORT_FETCH_SIZE = 500
+ORDEM_GAP = 1024
+DENSE_GAP = 8
+
+class LinkOwnershipError(Exception):
+    pass
+
+LINK_COLUMNS = "u.versao, l.id, l.usuario_id, l.titulo, l.url, l.ordem"
+
+def _versioned_links(rows):
+    # Uma linha por link, ou uma só com o link NULL quando não há nenhum; sem linhas, o usuário não existe
+    versao = rows[0]["versao"] if rows else None
+    links = [
+        Link(id=row["id"], usuario_id=row["usuario_id"], titulo=row["titulo"], url=row["url"], ordem=row["ordem"])
+        for row in rows if row["id"] is not None
+    ]
+    return links, versao
+
 class LinkRepository:
     def getAll(self, usuario_id):
+        """(links, versao): a versão do conteúdo (ETag) vem na mesma consulta que os links."""
         try:
-            with get_db_cursor() as cursor:
+            with get_read_cursor(usuario_id=usuario_id, shard=router.shard_for_user(usuario_id)) as cursor:
                 cursor.execute(
-                    "SELECT id, usuario_id, titulo, url, ordem FROM links WHERE usuario_id = %s ORDER BY ordem ASC",
+                    f"SELECT {LINK_COLUMNS} FROM usuarios u LEFT JOIN links l ON l.usuario_id = u.id "
+                    "WHERE u.id = %s ORDER BY l.ordem ASC",
                     (usuario_id,)
                 )
-                links = cursor.fetchall()
-
-                if links:
-                    return [Link(**link) for link in links]
-                return []
+                return _versioned_links(cursor.fetchall())
         
         except Error as e:
             logging.error(f"Erro ao tentar buscar links: {e}")
             return None
 
-    def create(self, usuario_id, titulo, url, ordem):
+    def get_page(self, usuario_id, limit, after=None):
+        """(links, versao) da página; o filtro do cursor fica no ON para a linha do usuário vir mesmo sem links."""
+        try:
+            with get_read_cursor(usuario_id=usuario_id, shard=router.shard_for_user(usuario_id)) as cursor:
+                if after is None:
+                    filtro, params = "", ()
+                elif after[0] is None:
+                    # NULL vem antes de qualquer posição no ORDER BY: segue pelos NULL restantes e depois por todos os demais
+                    filtro, params = "AND ((l.ordem IS NULL AND l.id > %s) OR l.ordem IS NOT NULL) ", (after[1],)
+                else:
+                    ordem, link_id = after
+                    filtro, params = "AND (l.ordem > %s OR (l.ordem = %s AND l.id > %s)) ", (ordem, ordem, link_id)
+
+                cursor.execute(
+                    f"SELECT {LINK_COLUMNS} FROM usuarios u LEFT JOIN links l ON l.usuario_id = u.id {filtro}"
+                    "WHERE u.id = %s ORDER BY l.ordem ASC, l.id ASC LIMIT %s",
+                    (*params, usuario_id, limit)
+                )
+                return _versioned_links(cursor.fetchall())
+
+        except Error as e:
+            logging.error(f"Erro ao tentar buscar página de links: {e}")
+            return None
+
+    def iter_all(self, usuario_id):
+        try:
+            # Conexão própria (de preferência na réplica): o streaming continua depois que a
+            # transação da requisição termina
+            with get_read_cursor(usuario_id=usuario_id, standalone=True, shard=router.shard_for_user(usuario_id)) as cursor:
+                # Cursor sem buffer: as linhas vêm do servidor conforme são consumidas
+                cursor.execute(
+                    "SELECT titulo, url, ordem FROM links WHERE usuario_id = %s ORDER BY ordem ASC, id ASC",
+                    (usuario_id,)
+                )
+
+                while True:
+                    rows = cursor.fetchmany(EXPORT_FETCH_SIZE)
+                    if not rows:
+                        break
+                    yield from rows
+
+        except Error as e:
+            logging.error(f"Erro ao tentar exportar links: {e}")
+
+    def create(self, usuario_id, titulo, url):
         try:
-            with get_db_cursor() as cursor:
+            with get_db_cursor(shard=router.shard_for_write(usuario_id)) as cursor:
+                # A trava da linha do usuário enfileira as criações dele: sem ela, dois INSERT ... SELECT
+                # concorrentes disputam a mesma lacuna do índice e um morre em deadlock
+                self._bump_version(cursor, usuario_id)
+                cursor.execute(
+                    "SELECT COALESCE(MAX(ordem), 0) + %s AS ordem FROM links WHERE usuario_id = %s FOR UPDATE",
+                    (ORDEM_GAP, usuario_id)
+                )
+                ordem = cursor.fetchone()["ordem"]
                 cursor.execute(
                     "INSERT INTO links (usuario_id, titulo, url, ordem) VALUES (%s, %s, %s, %s)",
-                     (usuario_id, titulo, url, ordem)
+                    (usuario_id, titulo, url, ordem)
                 )
                 link_id = cursor.lastrowid
 
-                return Link(
-                    id=link_id,
-                    usuario_id=usuario_id,
-                    titulo=titulo,
-                    url=url,
-                    ordem=ordem
-                )
+            self._invalidate(usuario_id)
+            return Link(
+                id=link_id,
+                usuario_id=usuario_id,
+                titulo=titulo,
+                url=url,
+                ordem=ordem
+            )
         
         except Error as e:
             logging.error(f"Erro ao tentar criar link: {e}")
@@ -46,7 +117,7 @@ class LinkRepository:
 
     def find_by_id(self, link_id, usuario_id):
         try:
-            with get_db_cursor() as cursor:
+            with get_read_cursor(usuario_id=usuario_id, shard=router.shard_for_user(usuario_id)) as cursor:
                 cursor.execute(
                     "SELECT * FROM links WHERE id = %s AND usuario_id = %s",
                     (link_id, usuario_id)
@@ -61,16 +132,49 @@ class LinkRepository:
             logging.error(f"Erro ao tentar buscar link por ID: {e}")
             return None
 
+    def find_public(self, link_id):
+        cached = link_cache.get(link_id)
+        if cached is not None:
+            return cached
+
+        generation = link_cache.generation()
+
+        def fetch(cursor):
+            cursor.execute(
+                "SELECT usuario_id, url FROM links WHERE id = %s",
+                (link_id,)
+            )
+            return cursor.fetchone()
+
+        try:
+            link = None
+            for shard in router.link_shard_candidates(link_id):
+                link = replica_read(fetch, owner=lambda link: link["usuario_id"], shard=shard)
+                if link:
+                    break
+
+            if link:
+                link_cache.set(link_id, link, generation)
+            return link
+
+        except Error as e:
+            logging.error(f"Erro ao tentar buscar link público: {e}")
+            return False
+
     def update(self, titulo, url, id, usuario_id):
         try:
-            with get_db_cursor() as cursor:
+            with get_db_cursor(shard=router.shard_for_write(usuario_id)) as cursor:
                  cursor.execute(
                      "UPDATE links SET titulo = %s, url = %s WHERE id = %s AND usuario_id = %s",
                      (titulo, url, id, usuario_id)
                  )
                  rows_affected = cursor.rowcount
-            
-                 return rows_affected > 0
+
+                 if rows_affected > 0:
+                     self._bump_version(cursor, usuario_id)
+
+            self._invalidate(usuario_id, [id])
+            return rows_affected > 0
             
         except Error as e:
             logging.error(f"Erro ao tentar atualizar link: {e}")
@@ -78,36 +182,289 @@ class LinkRepository:
     
     def delete(self, id, usuario_id):
         try:
-            with get_db_cursor() as cursor:
+            with get_db_cursor(shard=router.shard_for_write(usuario_id)) as cursor:
                 cursor.execute(
                     "DELETE FROM links WHERE id = %s AND usuario_id = %s",
                     (id, usuario_id)
                 )
                 rows_affected = cursor.rowcount
 
-                return rows_affected > 0
+                if rows_affected > 0:
+                    self._bump_version(cursor, usuario_id)
+
+            self._invalidate(usuario_id, [id])
+            return rows_affected > 0
             
         except Error as e:
             logging.error(f"Erro ao tentar deletar link: {e}")
             return False
 
     def reorder(self, usuario_id, links):
+        ordens = {link["id"]: link["ordem"] for link in links}
+        ids = list(ordens)
+        alterados = 0
+
         try:
-            with get_db_cursor() as cursor:
-                for link in links:
+            with get_db_cursor(shard=router.shard_for_write(usuario_id)) as cursor:
+                for inicio in range(0, len(ids), REORDER_BATCH_SIZE):
+                    lote = ids[inicio:inicio + REORDER_BATCH_SIZE]
+                    marcadores = ", ".join(["%s"] * len(lote))
+                    casos = " ".join(["WHEN %s THEN %s"] * len(lote))
+
+                    if SQLITE:
+                        alterados += self._reorder_batch_sqlite(cursor, usuario_id, lote, ordens)
+                        continue
+
+                    params = [usuario_id, *lote, len(lote), *lote]
+                    for link_id in lote:
+                        params.extend((link_id, ordens[link_id]))
+                    params.append(usuario_id)
+
+                    # A junção com a contagem só casa se todos os IDs do lote pertencem ao usuário;
+                    # a versão do usuário sempre muda, então rowcount = 1 + links alterados
                     cursor.execute(
-                        "UPDATE links SET ordem = %s WHERE id = %s AND usuario_id = %s",
-                        (link["ordem"], link["id"], usuario_id)
+                        "UPDATE usuarios u "
+                        "JOIN (SELECT COUNT(*) AS total FROM links "
+                        f"WHERE usuario_id = %s AND id IN ({marcadores})) AS proprios ON proprios.total = %s "
+                        f"JOIN links l ON l.usuario_id = u.id AND l.id IN ({marcadores}) "
+                        f"SET l.ordem = CASE l.id {casos} END, u.versao = u.versao + 1 "
+                        "WHERE u.id = %s",
+                        params
                     )
-        
-                return True
+
+                    if cursor.rowcount == 0:
+                        raise LinkOwnershipError()
+                    alterados += cursor.rowcount - 1
+
+            self._invalidate(usuario_id)
+            return alterados
+
+        except LinkOwnershipError:
+            return None
         except Error as e:
             logging.error(f"Erro ao tentar reordenar links: {e}")
             return False
 
+    def _reorder_batch_sqlite(self, cursor, usuario_id, lote, ordens):
+        # Sem UPDATE com JOIN no SQLite: confere a posse, reordena e muda a versão em comandos separados
+        marcadores = ", ".join(["%s"] * len(lote))
+        cursor.execute(
+            f"SELECT COUNT(*) AS total FROM links WHERE usuario_id = %s AND id IN ({marcadores})",
+            (usuario_id, *lote)
+        )
+        if cursor.fetchone()["total"] != len(lote):
+            raise LinkOwnershipError()
+
+        casos = " ".join(["WHEN %s THEN %s"] * len(lote))
+        params = [valor for link_id in lote for valor in (link_id, ordens[link_id])]
+        # Como no MySQL, conta só as linhas cuja ordem mudou
+        cursor.execute(
+            f"UPDATE links SET ordem = CASE id {casos} END "
+            f"WHERE usuario_id = %s AND id IN ({marcadores}) AND ordem IS NOT CASE id {casos} END",
+            (*params, usuario_id, *lote, *params)
+        )
+        alterados = cursor.rowcount
+        self._bump_version(cursor, usuario_id)
+        return alterados
+
+    def create_many(self, usuario_id, links):
+        try:
+            # Cada lote da importação é confirmado sozinho: em falha, a resposta diz quantos entraram
+            with get_db_cursor(standalone=True, shard=router.shard_for_write(usuario_id)) as cursor:
+                self._insert_many(cursor, usuario_id, links)
+                self._bump_version(cursor, usuario_id)
+
+            self._invalidate(usuario_id)
+            return len(links)
+
+        except Error as e:
+            logging.error(f"Erro ao tentar importar links: {e}")
+            return False
+
+    def apply_batch(self, usuario_id, creates, updates, deletes):
+        try:
+            with get_db_cursor(shard=router.shard_for_write(usuario_id)) as cursor:
+                ids = [link["id"] for link in updates] + list(deletes)
+                existentes = set()
+
+                if ids:
+                    cursor.execute(
+                        f"SELECT id FROM links WHERE usuario_id = %s AND id IN ({', '.join(['%s'] * len(ids))}) FOR UPDATE",
+                        (usuario_id, *ids)
+                    )
+                    existentes = {row["id"] for row in cursor.fetchall()}
+
+                remover = [link_id for link_id in deletes if link_id in existentes]
+                if remover:
+                    cursor.execute(
+                        f"DELETE FROM links WHERE usuario_id = %s AND id IN ({', '.join(['%s'] * len(remover))})",
+                        (usuario_id, *remover)
+                    )
+
+                atualizar = [link for link in updates if link["id"] in existentes]
+                if atualizar:
+                    casos = " ".join(["WHEN %s THEN %s"] * len(atualizar))
+                    params = []
+                    for campo in ("titulo", "url"):
+                        for link in atualizar:
+                            params.extend((link["id"], link[campo]))
+                    params.append(usuario_id)
+                    params.extend(link["id"] for link in atualizar)
+
+                    cursor.execute(
+                        f"UPDATE links SET titulo = CASE id {casos} END, url = CASE id {casos} END "
+                        f"WHERE usuario_id = %s AND id IN ({', '.join(['%s'] * len(atualizar))})",
+                        params
+                    )
+
+                if creates:
+                    self._insert_many(cursor, usuario_id, creates)
+
+                if creates or remover or atualizar:
+                    self._bump_version(cursor, usuario_id)
+
+            self._invalidate(usuario_id, remover + [link["id"] for link in atualizar])
+            return existentes
+
+        except Error as e:
+            logging.error(f"Erro ao tentar aplicar lote de links: {e}")
+            return False
+
+    def move(self, usuario_id, link_id, before_id=None, after_id=None):
+        ids = [i for i in (link_id, before_id, after_id) if i is not None]
+
+        try:
+            with get_db_cursor(shard=router.shard_for_write(usuario_id)) as cursor:
+                ordens = self._lock_ordens(cursor, usuario_id, ids)
+                if len(ordens) != len(ids):
+                    return None
+
+                if None in ordens.values():
+                    self._renormalize(cursor, usuario_id)
+                    ordens = self._lock_ordens(cursor, usuario_id, ids)
+
+                anterior, proximo = self._neighbours(cursor, usuario_id, link_id, ordens, before_id, after_id)
+                if anterior is not None and proximo is not None and anterior >= proximo:
+                    return None
+
+                nova_ordem = self._rank_between(anterior, proximo)
+                if nova_ordem is None:
+                    # Sem espaço entre os vizinhos: espalha as posições e recalcula
+                    self._renormalize(cursor, usuario_id)
+                    ordens = self._lock_ordens(cursor, usuario_id, ids)
+                    anterior, proximo = self._neighbours(cursor, usuario_id, link_id, ordens, before_id, after_id)
+                    nova_ordem = self._rank_between(anterior, proximo)
+
+                if SQLITE:
+                    cursor.execute(
+                        "UPDATE links SET ordem = %s WHERE id = %s AND usuario_id = %s",
+                        (nova_ordem, link_id, usuario_id)
+                    )
+                    self._bump_version(cursor, usuario_id)
+                else:
+                    cursor.execute(
+                        "UPDATE links l JOIN usuarios u ON u.id = l.usuario_id "
+                        "SET l.ordem = %s, u.versao = u.versao + 1 "
+                        "WHERE l.id = %s AND l.usuario_id = %s",
+                        (nova_ordem, link_id, usuario_id)
+                    )
+
+            self._invalidate(usuario_id)
+
+            folgas = [abs(nova_ordem - vizinho) for vizinho in (anterior, proximo) if vizinho is not None]
+            return {
+                "ordem": nova_ordem,
+                "denso": bool(folgas) and min(folgas) < DENSE_GAP
+            }
+
+        except Error as e:
+            logging.error(f"Erro ao tentar mover link: {e}")
+            return False
+
+    def renormalize(self, usuario_id):
+        try:
+            with get_db_cursor(shard=router.shard_for_write(usuario_id)) as cursor:
+                self._renormalize(cursor, usuario_id)
+
+            self._invalidate(usuario_id)
+            return True
+
+        except Error as e:
+            logging.error(f"Erro ao tentar renormalizar a ordem dos links: {e}")
+            return False
+
+    def _insert_many(self, cursor, usuario_id, links):
+        cursor.execute(
+            "SELECT COALESCE(MAX(ordem), 0) AS ordem FROM links WHERE usuario_id = %s FOR UPDATE",
+            (usuario_id,)
+        )
+        base = cursor.fetchone()["ordem"]
+
+        cursor.executemany(
+            "INSERT INTO links (usuario_id, titulo, url, ordem) VALUES (%s, %s, %s, %s)",
+            [
+                (usuario_id, link["titulo"], link["url"], base + ORDEM_GAP * posicao)
+                for posicao, link in enumerate(links, start=1)
+            ]
+        )
+
+    def _lock_ordens(self, cursor, usuario_id, ids):
+        cursor.execute(
+            f"SELECT id, ordem FROM links WHERE usuario_id = %s AND id IN ({', '.join(['%s'] * len(ids))}) FOR UPDATE",
+            (usuario_id, *ids)
+        )
+        return {row["id"]: row["ordem"] for row in cursor.fetchall()}
+
+    def _neighbours(self, cursor, usuario_id, link_id, ordens, before_id, after_id):
+        if after_id is not None and before_id is not None:
+            return ordens[after_id], ordens[before_id]
+
+        if after_id is not None:
+            cursor.execute(
+                "SELECT MIN(ordem) AS ordem FROM links WHERE usuario_id = %s AND ordem > %s AND id <> %s",
+                (usuario_id, ordens[after_id], link_id)
+            )
+            return ordens[after_id], cursor.fetchone()["ordem"]
+
+        cursor.execute(
+            "SELECT MAX(ordem) AS ordem FROM links WHERE usuario_id = %s AND ordem < %s AND id <> %s",
+            (usuario_id, ordens[before_id], link_id)
+        )
+        return cursor.fetchone()["ordem"], ordens[before_id]
+
+    def _rank_between(self, anterior, proximo):
+        if anterior is None:
+            return proximo - ORDEM_GAP
+        if proximo is None:
+            return anterior + ORDEM_GAP
+        if proximo - anterior >= 2:
+            return (anterior + proximo) // 2
+        return None
+
+    def _renormalize(self, cursor, usuario_id):
+        if SQLITE:
+            cursor.execute(
+                "UPDATE links SET ordem = r.posicao * %s "
+                "FROM (SELECT id, ROW_NUMBER() OVER (ORDER BY ordem, id) AS posicao FROM links WHERE usuario_id = %s) AS r "
+                "WHERE r.id = links.id",
+                (ORDEM_GAP, usuario_id)
+            )
+            self._bump_version(cursor, usuario_id)
+            return
+
+        cursor.execute(
+            "UPDATE links l "
+            "JOIN (SELECT id, ROW_NUMBER() OVER (ORDER BY ordem, id) AS posicao FROM links WHERE usuario_id = %s) AS r "
+            "ON r.id = l.id "
+            "SET l.ordem = r.posicao * %s "
+            "WHERE l.usuario_id = %s",
+            (usuario_id, ORDEM_GAP, usuario_id)
+        )
+        self._bump_version(cursor, usuario_id)
+
     def count_by_user(self, usuario_id):
         try:
-            with get_db_cursor(dictionary=False) as cursor:
+            with get_read_cursor(dictionary=False, usuario_id=usuario_id, shard=router.shard_for_user(usuario_id)) as cursor:
                 cursor.execute(
                     "SELECT COUNT(*) FROM links WHERE usuario_id = %s",
                     (usuario_id,)
@@ -119,3 +476,20 @@ class LinkRepository:
         except Error as e:
             logging.error(f"Erro ao contar links: {e}")
             return 0
+
+    def _invalidate(self, usuario_id, link_ids=()):
+        mark_written(usuario_id)
+        # Só depois do commit: antes disso outra requisição ainda lê (e cachearia) o valor antigo
+        def invalidate():
+            mark_changed(usuario_id)
+            profile_cache.invalidate_user(usuario_id)
+            for link_id in link_ids:
+                link_cache.delete(link_id)
+
+        on_commit(invalidate)
+
+    def _bump_version(self, cursor, usuario_id):
+        cursor.execute(
+            "UPDATE usuarios SET versao = versao + 1 WHERE id = %s",
+            (usuario_id,)
+        )
@@ -0,0 +1,42 @@
+from Utils.storage import Error, get_db_cursor
+import logging
+
+logging.basicConfig(level=logging.ERROR)
+
+class TokenRepository:
+    def revoke(self, chave, expira_em):
+        try:
+            with get_db_cursor() as cursor:
+                cursor.execute(
+                    "INSERT IGNORE INTO tokens_revogados (jti, expira_em) VALUES (%s, %s)",
+                    (chave, expira_em)
+                )
+                return True
+
+        except Error as e:
+            logging.error(f"Erro ao tentar revogar token: {e}")
+            return False
+
+    def list_since(self, ultimo_id, agora):
+        try:
+            with get_db_cursor() as cursor:
+                cursor.execute(
+                    "SELECT id, jti, expira_em FROM tokens_revogados "
+                    "WHERE id > %s AND expira_em > %s ORDER BY id",
+                    (ultimo_id, agora)
+                )
+                return cursor.fetchall()
+
+        except Error as e:
+            logging.error(f"Erro ao tentar buscar tokens revogados: {e}")
+            return None
+
+    def purge_expired(self, agora):
+        try:
+            with get_db_cursor() as cursor:
+                cursor.execute("DELETE FROM tokens_revogados WHERE expira_em <= %s", (agora,))
+                return cursor.rowcount
+
+        except Error as e:
+            logging.error(f"Erro ao tentar remover tokens revogados expirados: {e}")
+            return None
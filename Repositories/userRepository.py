@@ -1,60 +1,158 @@
-from Utils.db_railway import get_db_cursor
-from mysql.connector import Error
+from Utils.storage import (
+    Error, get_db_cursor, get_read_cursor, replica_read, on_commit, mark_written, set_rollback_only, duplicate_key
+)
+from Utils.shard_router import router
+from Utils.cache import profile_cache, link_cache, mark_changed
 from Models.user import User
 import logging
+import os
+import re
+from dotenv import load_dotenv
 
+load_dotenv()
 logging.basicConfig(level=logging.ERROR)
 
+USERNAME_ALLOCATION_ATTEMPTS = 5
+DIRECTORY_TABLE = "usuarios_diretorio"
+
+PROFILE_SINGLE_QUERY = os.getenv("PROFILE_SINGLE_QUERY", "true").lower() not in ("0", "false", "no")
+
+class DuplicateUserError(Exception):
+    def __init__(self, campo):
+        super().__init__(f"{campo} já existente")
+        self.campo = campo
+
+def _raise_if_duplicate(e):
+    # Corridas entre a verificação e a escrita caem nas chaves UNIQUE de username/email
+    chave = duplicate_key(e)
+    if chave is not None:
+        raise DuplicateUserError("email" if "email" in chave else "username") from e
+
 class UserRepository:
     def create(self, username, email, senha):
         try:
-            with get_db_cursor() as cursor:
-                cursor.execute(
-                    "INSERT INTO usuarios (username, email, senha) VALUES (%s, %s, %s)",
-                    (username, email, senha)
-                )
-                user_id = cursor.lastrowid
-            
-                return User(
-                    id=user_id,
-                    username=username,
-                    email=email,
-                    senha=senha
-                )
+            # Com shards, o diretório reserva username/e-mail (únicos entre todos os bancos) e gera o id
+            user_id, shard = router.allocate(username, email)
+
+            try:
+                with get_db_cursor(shard=shard) as cursor:
+                    cursor.execute(
+                        "INSERT INTO usuarios (id, username, email, senha) VALUES (%s, %s, %s, %s)",
+                        (user_id, username, email, senha)
+                    )
+                    user_id = user_id or cursor.lastrowid
+            except Error:
+                # A reserva no diretório não pode ser confirmada sem o usuário no shard
+                if router.sharded:
+                    set_rollback_only()
+                raise
+
+            return User(
+                id=user_id,
+                username=username,
+                email=email,
+                senha=senha
+            )
             
         except Error as e:
+            _raise_if_duplicate(e)
             logging.error(f"Erro ao tentar criar usuário: {e}")
             return False
 
-    def find_by_email(self, email):
+    def create_with_available_username(self, base_username, email, senha):
+        for _ in range(USERNAME_ALLOCATION_ATTEMPTS):
+            username = self.next_available_username(base_username)
+            if username is None:
+                return False
+
+            try:
+                return self.create(username, email, senha)
+            except DuplicateUserError as e:
+                # Outro cadastro levou o mesmo sufixo entre a consulta e o INSERT: recalcula
+                if e.campo != "username":
+                    raise
+
+        logging.error(f"Não foi possível alocar username para a base {base_username}")
+        return False
+
+    def next_available_username(self, base_username):
+        like = base_username.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        regexp = f"^{re.escape(base_username)}[0-9]{{0,9}}$"
+        tabela = DIRECTORY_TABLE if router.sharded else "usuarios"
+
         try:
             with get_db_cursor() as cursor:
+                # LIKE 'base%' percorre só o intervalo do índice UNIQUE; o REGEXP filtra base + dígitos
                 cursor.execute(
-                    "SELECT id, username, email, senha, foto_perfil FROM usuarios WHERE email = %s",
-                    (email,)
+                    "SELECT COALESCE(SUM(username = %s), 0) AS base_em_uso, "
+                    "COALESCE(MAX(CAST(SUBSTRING(username, %s) AS UNSIGNED)), 0) AS maior_sufixo "
+                    f"FROM {tabela} WHERE username LIKE %s ESCAPE %s AND username REGEXP %s",
+                    (base_username, len(base_username) + 1, like, "\\", regexp)
                 )
-                user = cursor.fetchone()
-            
-                if user:
-                    return User(**user)
+                row = cursor.fetchone()
+
+                if not row["base_em_uso"]:
+                    return base_username
+                return f"{base_username}{int(row['maior_sufixo']) + 1}"
+
+        except Error as e:
+            logging.error(f"Erro ao tentar buscar username disponível: {e}")
+            return None
+
+    def check_availability(self, username, email):
+        # Com shards, a unicidade vale entre todos os bancos: consulta o diretório
+        tabela = DIRECTORY_TABLE if router.sharded else "usuarios"
+
+        try:
+            with get_db_cursor() as cursor:
+                # OR sobre as duas chaves UNIQUE: index merge, sem varrer a tabela
+                cursor.execute(
+                    "SELECT COALESCE(SUM(username = %s), 0) AS username_em_uso, "
+                    "COALESCE(SUM(email = %s), 0) AS email_em_uso "
+                    f"FROM {tabela} WHERE username = %s OR email = %s",
+                    (username, email, username, email)
+                )
+                row = cursor.fetchone()
+
+                return {"username": not row["username_em_uso"], "email": not row["email_em_uso"]}
+
+        except Error as e:
+            logging.error(f"Erro ao tentar verificar username e e-mail: {e}")
+            return None
+
+    def find_by_email(self, email):
+        def fetch(cursor):
+            cursor.execute(
+                "SELECT id, username, email, senha, foto_perfil FROM usuarios WHERE email = %s",
+                (email,)
+            )
+            user = cursor.fetchone()
+            return User(**user) if user else None
+
+        try:
+            shard = router.locate("email", email)
+            if shard is None:
                 return None
+            return replica_read(fetch, owner=lambda user: user.id, shard=shard)
             
         except Error as e:
             logging.error(f"Erro ao tentar buscar usuário pelo email: {e}")
             return None
     
     def find_by_username(self, username):
+        def fetch(cursor):
+            cursor.execute(
+                "SELECT id, username, email, senha, foto_perfil FROM usuarios WHERE username = %s",
+                (username,)
+            )
+            user = cursor.fetchone()
+            return User(**user) if user else None
+
         try:
-            with get_db_cursor() as cursor:
-                cursor.execute(
-                    "SELECT id, username, email, senha, foto_perfil FROM usuarios WHERE username = %s",
-                    (username,)
-                )
-                user = cursor.fetchone()
-            
-                if user:
-                    return User(**user)
+            shard = router.locate("username", username)
+            if shard is None:
                 return None
+            return replica_read(fetch, owner=lambda user: user.id, shard=shard)
             
         except Error as e:
             logging.error(f"Erro ao tentar buscar usuário pelo username: {e}")
@@ -62,7 +160,7 @@ class UserRepository:
 
     def find_by_id(self, usuario_id):
         try:
-            with get_db_cursor() as cursor:
+            with get_read_cursor(usuario_id=usuario_id, shard=router.shard_for_user(usuario_id)) as cursor:
                 cursor.execute(
                     "SELECT id, username, email, senha, foto_perfil FROM usuarios WHERE id = %s",
                     (usuario_id,)
@@ -78,105 +176,221 @@ class UserRepository:
             return None
 
     def get_public_profile(self, username):
-        try:
-            with get_db_cursor() as cursor:
-                cursor.execute(
-                    "SELECT id, username, foto_perfil FROM usuarios WHERE username = %s",
-                    (username,)
-                )
-                user = cursor.fetchone()
+        cached = profile_cache.get(username)
+        if cached is not None:
+            return cached
 
-                if not user:
-                    return None
+        generation = profile_cache.generation()
+        profile = self._fetch_public_profile(username)
 
-                cursor.execute(
-                    "SELECT id, titulo, url, ordem FROM links WHERE usuario_id = %s ORDER BY ordem ASC",
-                    (user["id"],)
-                )
-                links = cursor.fetchall()
-
-                return {
-                    "id": user["id"],
-                    "username": user["username"],
-                    "foto_perfil": user["foto_perfil"],
-                    "links": links
-                }
-            
+        if profile:
+            profile_cache.set(username, profile, generation)
+        return profile
+
+    def _fetch_public_profile(self, username):
+        try:
+            shard = router.locate("username", username)
         except Error as e:
-            logging.error(f"Erro ao tentar buscar o perfil público: {e}")
+            logging.error(f"Erro ao tentar localizar o perfil público: {e}")
+            return None
+        if shard is None:
             return None
 
-    def update_foto(self, usuario_id, image_url):
-        try:
-            with get_db_cursor() as cursor:
-                cursor.execute(
-                    "UPDATE usuarios SET foto_perfil = %s WHERE id = %s",
-                    (image_url, usuario_id)
+        if PROFILE_SINGLE_QUERY:
+            try:
+                return replica_read(
+                    lambda cursor: self._public_profile_single_query(cursor, username),
+                    owner=lambda profile: profile["id"],
+                    shard=shard
                 )
-                rows_affected = cursor.rowcount
-            
-                return rows_affected > 0
-            
+            except Error as e:
+                logging.error(f"Erro na consulta única do perfil público, usando duas consultas: {e}")
+
+        try:
+            return replica_read(
+                lambda cursor: self._public_profile_two_queries(cursor, username),
+                owner=lambda profile: profile["id"],
+                shard=shard
+            )
         except Error as e:
-            logging.error(f"Erro ao tentar atualizar a foto de perfil: {e}")
-            return False
+            logging.error(f"Erro ao tentar buscar o perfil público: {e}")
+            return None
+
+    def _public_profile_single_query(self, cursor, username):
+        cursor.execute(
+            "SELECT u.id, u.username, u.foto_perfil, u.versao, l.id AS link_id, l.titulo, l.url, l.ordem "
+            "FROM usuarios u LEFT JOIN links l ON l.usuario_id = u.id "
+            "WHERE u.username = %s ORDER BY l.ordem ASC",
+            (username,)
+        )
+        rows = cursor.fetchall()
+
+        if not rows:
+            return None
+
+        user = rows[0]
+        return {
+            "id": user["id"],
+            "username": user["username"],
+            "foto_perfil": user["foto_perfil"],
+            "versao": user["versao"],
+            "links": [
+                {"id": row["link_id"], "titulo": row["titulo"], "url": row["url"], "ordem": row["ordem"]}
+                for row in rows if row["link_id"] is not None
+            ]
+        }
+
+    def _public_profile_two_queries(self, cursor, username):
+        cursor.execute(
+            "SELECT id, username, foto_perfil, versao FROM usuarios WHERE username = %s",
+            (username,)
+        )
+        user = cursor.fetchone()
 
-    def update_username(self, usuario_id, new_username):
+        if not user:
+            return None
+
+        cursor.execute(
+            "SELECT id, titulo, url, ordem FROM links WHERE usuario_id = %s ORDER BY ordem ASC",
+            (user["id"],)
+        )
+        links = cursor.fetchall()
+
+        return {
+            "id": user["id"],
+            "username": user["username"],
+            "foto_perfil": user["foto_perfil"],
+            "versao": user["versao"],
+            "links": links
+        }
+
+    def get_version(self, usuario_id):
         try:
-            with get_db_cursor() as cursor:
+            with get_read_cursor(usuario_id=usuario_id, shard=router.shard_for_user(usuario_id)) as cursor:
                 cursor.execute(
-                    "UPDATE usuarios SET username = %s WHERE id = %s",
-                    (new_username, usuario_id)
+                    "SELECT versao FROM usuarios WHERE id = %s",
+                    (usuario_id,)
                 )
-                rows_affected = cursor.rowcount
-            
-                return rows_affected > 0
-            
+                row = cursor.fetchone()
+
+                return row["versao"] if row else None
+
         except Error as e:
-            logging.error(f"Erro ao tentar atualizar username: {e}")
-            return False
+            logging.error(f"Erro ao tentar buscar a versão do conteúdo: {e}")
+            return None
+
+    def get_version_by_username(self, username):
+        cached = profile_cache.get(username)
+        if cached is not None:
+            return {"id": cached["id"], "versao": cached["versao"]}
+
+        def fetch(cursor):
+            cursor.execute(
+                "SELECT id, versao FROM usuarios WHERE username = %s",
+                (username,)
+            )
+            return cursor.fetchone()
 
-    def update_email(self, usuario_id, new_email):
         try:
-            with get_db_cursor() as cursor:
-                cursor.execute(
-                    "UPDATE usuarios SET email = %s WHERE id = %s",
-                    (new_email, usuario_id)
-                )
-                rows_affected = cursor.rowcount
-            
-                return rows_affected > 0
-            
+            shard = router.locate("username", username)
+            if shard is None:
+                return None
+            return replica_read(fetch, owner=lambda row: row["id"], shard=shard)
+
         except Error as e:
-            logging.error(f"Erro ao tentar atualizar e-mail: {e}")
-            return False
+            logging.error(f"Erro ao tentar buscar a versão do perfil: {e}")
+            return None
 
-    def update_password(self, usuario_id, new_password_hash):
+    def update_foto(self, usuario_id, image_url):
         try:
-            with get_db_cursor() as cursor:
+            with get_db_cursor(shard=router.shard_for_write(usuario_id)) as cursor:
                 cursor.execute(
-                    "UPDATE usuarios SET senha = %s WHERE id = %s",
-                    (new_password_hash, usuario_id)
+                    "UPDATE usuarios SET foto_perfil = %s, versao = versao + 1 WHERE id = %s",
+                    (image_url, usuario_id)
                 )
                 rows_affected = cursor.rowcount
             
-                return rows_affected > 0
+            self._invalidate(usuario_id)
+            return rows_affected > 0
             
         except Error as e:
-            logging.error(f"Erro ao tentar atualizar senha: {e}")
+            logging.error(f"Erro ao tentar atualizar a foto de perfil: {e}")
             return False
 
+    def update_username(self, usuario_id, new_username, senha_atual=None):
+        return self._update_field("username", usuario_id, new_username, senha_atual)
+
+    def update_email(self, usuario_id, new_email, senha_atual=None):
+        return self._update_field("email", usuario_id, new_email, senha_atual)
+
+    def update_password(self, usuario_id, new_password_hash, senha_atual=None):
+        return self._update_field("senha", usuario_id, new_password_hash, senha_atual)
+
     def delete_user(self, usuario_id):
         try:
-            with get_db_cursor() as cursor:
+            with get_db_cursor(shard=router.shard_for_write(usuario_id)) as cursor:
                 cursor.execute(
                     "DELETE FROM usuarios WHERE id = %s",
                     (usuario_id,)
                 )
                 rows_affected = cursor.rowcount
+
+            try:
+                router.remove(usuario_id)
+            except Error:
+                set_rollback_only()
+                raise
             
-                return rows_affected > 0
+            self._invalidate(usuario_id, links=True)
+            return rows_affected > 0
         
         except Error as e:
             logging.error(f"Erro ao tentar excluir usuário: {e}")
             return False
+
+    def _invalidate(self, usuario_id, links=False):
+        mark_written(usuario_id)
+        # Adiado para depois do commit, como em LinkRepository._invalidate
+        def invalidate():
+            mark_changed(usuario_id)
+            profile_cache.invalidate_user(usuario_id)
+            if links:
+                link_cache.delete_where(lambda link: link["usuario_id"] == usuario_id)
+
+        on_commit(invalidate)
+
+    def _update_field(self, campo, usuario_id, valor, senha_atual=None):
+        # O username aparece no perfil público: muda a versão (ETag) e invalida o cache
+        versao = ", versao = versao + 1" if campo == "username" else ""
+        sql = f"UPDATE usuarios SET {campo} = %s{versao} WHERE id = %s"
+        params = [valor, usuario_id]
+
+        # Senha conferida pelo chamador: só grava se ela não mudou desde a leitura
+        if senha_atual is not None:
+            sql += " AND senha = %s"
+            params.append(senha_atual)
+
+        try:
+            with get_db_cursor(shard=router.shard_for_write(usuario_id)) as cursor:
+                cursor.execute(sql, params)
+                rows_affected = cursor.rowcount
+
+            # Username e e-mail também vivem no diretório, onde a unicidade vale entre todos os shards
+            if rows_affected > 0 and campo in ("username", "email"):
+                try:
+                    router.rename(usuario_id, campo, valor)
+                except Error:
+                    set_rollback_only()
+                    raise
+
+            if campo == "username":
+                self._invalidate(usuario_id)
+            else:
+                mark_written(usuario_id)
+            # None: nenhuma linha casou (usuário removido ou senha trocada no meio tempo)
+            return True if rows_affected > 0 else None
+
+        except Error as e:
+            _raise_if_duplicate(e)
+            logging.error(f"Erro ao tentar atualizar {campo}: {e}")
+            return False
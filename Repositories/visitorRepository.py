@@ -0,0 +1,85 @@
+from Utils.storage import Error, SQLITE, get_db_cursor
+from Utils.shard_router import router
+from Utils.hyperloglog import HyperLogLog
+import logging
+
+logging.basicConfig(level=logging.ERROR)
+
+if SQLITE:
+    # OR IGNORE não cobre chaves estrangeiras no SQLite: o EXISTS descarta sketches de usuários removidos
+    UPSERT_SQL = (
+        "INSERT INTO perfil_visitantes (usuario_id, dia, sketch) "
+        "SELECT v.usuario_id, v.dia, v.sketch FROM (SELECT %s AS usuario_id, %s AS dia, %s AS sketch) AS v "
+        "WHERE EXISTS (SELECT 1 FROM usuarios WHERE id = v.usuario_id) "
+        "ON CONFLICT (usuario_id, dia) DO UPDATE SET sketch = excluded.sketch"
+    )
+else:
+    # IGNORE descarta sketches de usuários removidos antes do flush (falha de chave estrangeira)
+    UPSERT_SQL = (
+        "INSERT IGNORE INTO perfil_visitantes (usuario_id, dia, sketch) VALUES (%s, %s, %s) "
+        "ON DUPLICATE KEY UPDATE sketch = VALUES(sketch)"
+    )
+
+class VisitorRepository:
+    def merge_many(self, sketches):
+        """Grava os sketches e devolve os que ficaram pendentes (shard com erro ou usuário em migração)."""
+        try:
+            shards = router.shards_for_write(usuario_id for usuario_id, _ in sketches)
+        except Error as e:
+            logging.error(f"Erro ao tentar localizar os shards dos visitantes: {e}")
+            return sketches
+
+        pendentes = {}
+        por_shard = {}
+        for chave, sketch in sketches.items():
+            if chave[0] in shards:
+                por_shard.setdefault(shards[chave[0]], {})[chave] = sketch
+            else:
+                pendentes[chave] = sketch
+
+        for shard, lote in por_shard.items():
+            if not self._merge_shard(shard, lote):
+                pendentes.update(lote)
+        return pendentes
+
+    def _merge_shard(self, shard, sketches):
+        chaves = list(sketches)
+        filtro = " OR ".join(["(usuario_id = %s AND dia = %s)"] * len(chaves))
+
+        try:
+            with get_db_cursor(shard=shard) as cursor:
+                # FOR UPDATE serializa workers que gravam o mesmo (perfil, dia); a união é o máximo por registrador
+                cursor.execute(
+                    f"SELECT usuario_id, dia, sketch FROM perfil_visitantes WHERE {filtro} FOR UPDATE",
+                    [valor for chave in chaves for valor in chave]
+                )
+                gravados = {(row["usuario_id"], row["dia"]): row["sketch"] for row in cursor.fetchall()}
+
+                linhas = []
+                for chave, sketch in sketches.items():
+                    unido = HyperLogLog.from_bytes(sketch.to_bytes())
+                    if chave in gravados:
+                        unido.merge(HyperLogLog.from_bytes(gravados[chave]))
+                    linhas.append((*chave, unido.to_bytes()))
+
+                cursor.executemany(UPSERT_SQL, linhas)
+
+                return True
+
+        except Error as e:
+            logging.error(f"Erro ao tentar gravar visitantes: {e}")
+            return False
+
+    def get_range(self, usuario_id, inicio, fim):
+        try:
+            with get_db_cursor(shard=router.shard_for_user(usuario_id)) as cursor:
+                cursor.execute(
+                    "SELECT dia, sketch FROM perfil_visitantes "
+                    "WHERE usuario_id = %s AND dia >= %s AND dia < %s ORDER BY dia",
+                    (usuario_id, inicio, fim)
+                )
+                return cursor.fetchall()
+
+        except Error as e:
+            logging.error(f"Erro ao tentar buscar visitantes: {e}")
+            return None
@@ -1,12 +1,48 @@
-from flask import request, jsonify
+from flask import request, jsonify, g
 from functools import wraps
 import jwt, os
+import uuid
+from datetime import datetime, timedelta
+from math import ceil
 from dotenv import load_dotenv
+from werkzeug.exceptions import ServiceUnavailable
+from extensions import user_buckets, USER_RATE, USER_BURST
+from Utils.revocation import revocation_list
 
 load_dotenv()
 
 SECRET_KEY = os.getenv("SECRET_KEY")
 
+ACCESS_TOKEN_TTL = timedelta(minutes=15)
+REFRESH_TOKEN_TTL = timedelta(days=7)
+
+def create_token(usuario_id, tipo, ttl):
+    return jwt.encode(
+        {
+            "id": usuario_id,
+            "jti": uuid.uuid4().hex,
+            "exp": datetime.utcnow() + ttl,
+            "type": tipo
+        },
+        SECRET_KEY,
+        algorithm="HS256"
+    )
+
+def create_tokens(usuario_id):
+    return create_token(usuario_id, "access", ACCESS_TOKEN_TTL), create_token(usuario_id, "refresh", REFRESH_TOKEN_TTL)
+
+def decode_token(token):
+    decoded = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+    if revocation_list.is_revoked(decoded.get("jti"), decoded["id"]):
+        raise jwt.InvalidTokenError("Token revogado")
+    return decoded
+
+def revoke_token(decoded):
+    # Tokens emitidos antes do jti existir só deixam de valer quando expiram
+    if not decoded.get("jti"):
+        return False
+    return revocation_list.revoke(decoded["jti"], datetime.utcfromtimestamp(decoded["exp"]))
+
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
@@ -21,7 +57,7 @@ def token_required(f):
             return jsonify({"error": "Formato de token inválido"}), 401
 
         try:
-            decoded = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+            decoded = decode_token(token)
 
             if decoded.get("type") == "refresh":
                 return jsonify({"error": "Use o access token, não o refresh token"}), 401
@@ -32,10 +68,22 @@ def token_required(f):
             return jsonify({"error": "Token expirado"}), 401
         except jwt.InvalidTokenError:
             return jsonify({"error": "Token inválido"}), 401
+        except ServiceUnavailable:
+            # Lista de revogados indisponível: 503 para tentar de novo, não 401 (que desloga o cliente)
+            raise
         except Exception as e:
             print(f"Erro inesperado ao validar token: {e}")
             return jsonify({"error": "Falha ao validar o token"}), 401
 
+        g.usuario_id = user_id
+        g.token = decoded
+
+        espera = user_buckets.acquire_token(f"usuario:{user_id}", USER_RATE, USER_BURST)
+        if espera:
+            response = jsonify({"error": "Muitas requisições, tente novamente em instantes"})
+            response.headers["Retry-After"] = str(ceil(espera))
+            return response, 429
+
         return f(user_id, *args, **kwargs)
 
     return decorated
\ No newline at end of file
@@ -0,0 +1,49 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BACKGROUND_WORKERS = int(os.getenv("BACKGROUND_WORKERS", 2))
+
+_executor = None
+_executor_pid = None
+_periodic = {}
+_lock = threading.Lock()
+
+def _get_executor():
+    global _executor, _executor_pid
+
+    with _lock:
+        # Threads não sobrevivem ao fork do gunicorn: cada processo cria o seu executor
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=BACKGROUND_WORKERS, thread_name_prefix="mylinks-bg")
+            _executor_pid = os.getpid()
+        return _executor
+
+def _run_logged(fn, args, kwargs):
+    try:
+        return fn(*args, **kwargs)
+    except Exception as e:
+        logging.error(f"Erro em tarefa de segundo plano {getattr(fn, '__name__', fn)}: {e}")
+
+def run_in_background(fn, *args, **kwargs):
+    return _get_executor().submit(_run_logged, fn, args, kwargs)
+
+def _loop(interval, fn):
+    while True:
+        time.sleep(interval)
+        _run_logged(fn, (), {})
+
+def every(name, interval, fn):
+    with _lock:
+        atual = _periodic.get(name)
+        if atual and atual[0] == os.getpid() and atual[1].is_alive():
+            return
+
+        thread = threading.Thread(target=_loop, args=(interval, fn), name=f"mylinks-{name}", daemon=True)
+        _periodic[name] = (os.getpid(), thread)
+        thread.start()
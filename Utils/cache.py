@@ -0,0 +1,159 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from dotenv import load_dotenv
+from Utils.rate_limit_storage import ChangeMarks, default_uri
+
+load_dotenv()
+
+# Instante da última alteração do conteúdo público de cada usuário, visto por todos os workers.
+# Cada worker tem o próprio cache: sem isso, os outros serviriam o valor velho até o TTL vencer
+content_changes = ChangeMarks(os.getenv("CACHE_INVALIDATION_URI", default_uri("mylinks-cache-invalidation")))
+
+def changed_at(usuario_id):
+    return content_changes.changed_at(f"usuario:{usuario_id}")
+
+def mark_changed(usuario_id):
+    content_changes.mark(f"usuario:{usuario_id}")
+
+class TTLCache:
+    def __init__(self, maxsize=1024, ttl=30, owner=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # Usuário dono de cada valor; com ele, alterações marcadas por mark_changed em qualquer
+        # processo derrubam as entradas lidas antes delas
+        self.owner = owner
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.RLock()
+        self._generation = 0
+
+    def generation(self):
+        # O instante da leitura vai junto: é comparado às alterações feitas em outros processos
+        return self._generation, time.time_ns()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+
+            if item is None:
+                self.misses += 1
+                return None
+
+            value, expires_at, read_at = item
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return None
+
+            if self.owner is None:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return value
+
+        # Fora do lock do cache: a marca compartilhada é lida sem trava, mas não há por que
+        # segurar as outras threads enquanto isso
+        if changed_at(self.owner(value)) >= read_at:
+            with self._lock:
+                if self._data.get(key) is item:
+                    self._remove(key)
+                self.misses += 1
+            return None
+
+        with self._lock:
+            if self._data.get(key) is item:
+                self._data.move_to_end(key)
+            self.hits += 1
+        return value
+
+    def set(self, key, value, generation=None):
+        with self._lock:
+            # Uma invalidação ocorreu enquanto o valor era lido do banco: não cachear dado possivelmente velho
+            if generation is not None and generation[0] != self._generation:
+                return False
+
+            if key in self._data:
+                self._remove(key)
+
+            read_at = generation[1] if generation is not None else time.time_ns()
+            self._data[key] = (value, time.monotonic() + self.ttl, read_at)
+            self._on_set(key, value)
+
+            while len(self._data) > self.maxsize:
+                oldest = next(iter(self._data))
+                self._remove(oldest)
+
+            return True
+
+    def delete(self, key):
+        with self._lock:
+            self._generation += 1
+            if key in self._data:
+                self._remove(key)
+
+    def delete_where(self, predicate):
+        with self._lock:
+            self._generation += 1
+            for key, (value, _, _) in list(self._data.items()):
+                if predicate(value):
+                    self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            for key in list(self._data):
+                self._remove(key)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0
+            }
+
+    def _remove(self, key):
+        value, _, _ = self._data.pop(key)
+        self._on_remove(key, value)
+
+    def _on_set(self, key, value):
+        pass
+
+    def _on_remove(self, key, value):
+        pass
+
+class ProfileCache(TTLCache):
+    def __init__(self, maxsize=1024, ttl=30):
+        super().__init__(maxsize, ttl, owner=lambda profile: profile["id"])
+        self._username_by_id = {}
+
+    def invalidate_user(self, usuario_id):
+        with self._lock:
+            self._generation += 1
+            username = self._username_by_id.get(usuario_id)
+            if username is not None and username in self._data:
+                self._remove(username)
+
+    def _on_set(self, key, value):
+        self._username_by_id[value["id"]] = key
+
+    def _on_remove(self, key, value):
+        if self._username_by_id.get(value["id"]) == key:
+            del self._username_by_id[value["id"]]
+
+profile_cache = ProfileCache(
+    maxsize=int(os.getenv("PROFILE_CACHE_SIZE", 1024)),
+    ttl=float(os.getenv("PROFILE_CACHE_TTL", 30))
+)
+
+link_cache = TTLCache(
+    maxsize=int(os.getenv("LINK_CACHE_SIZE", 10000)),
+    ttl=float(os.getenv("LINK_CACHE_TTL", 300)),
+    owner=lambda link: link["usuario_id"]
+)
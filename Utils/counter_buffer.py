@@ -0,0 +1,28 @@
+import logging
+import threading
+
+class CounterBuffer:
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def add(self, key, amount=1):
+        with self._lock:
+            if key not in self._counts and len(self._counts) >= self.max_keys:
+                logging.error(f"Buffer de contadores cheio, descartando incremento de {key}")
+                return False
+            self._counts[key] = self._counts.get(key, 0) + amount
+            return True
+
+    def drain(self):
+        with self._lock:
+            counts, self._counts = self._counts, {}
+            return counts
+
+    def restore(self, counts):
+        for key, amount in counts.items():
+            self.add(key, amount)
+
+    def __len__(self):
+        return len(self._counts)
@@ -0,0 +1,194 @@
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+import mysql.connector
+from mysql.connector.errors import PoolError
+
+WAIT_BUCKETS_MS = [1, 5, 10, 50, 100, 500, 1000, 5000]
+
+class PoolTimeoutError(PoolError):
+    pass
+
+class ConnectionPool:
+    """
+    Pool de conexões MySQL com tamanho mínimo/máximo, overflow temporário e espera limitada.
+
+    Até ``max_size`` conexões ficam abertas; em picos, mais ``max_overflow`` podem ser criadas
+    e são fechadas ao serem devolvidas. Com tudo em uso, ``acquire`` espera até ``timeout``
+    segundos por uma devolução antes de falhar com PoolTimeoutError.
+    """
+
+    def __init__(self, config, min_size=1, max_size=5, max_overflow=5, timeout=5.0,
+                 idle_timeout=300.0, ping_after=30.0):
+        self.config = config
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.ping_after = ping_after
+
+        self._cond = threading.Condition()
+        self._reset_state()
+
+    def _reset_state(self):
+        self._pid = os.getpid()
+        self._idle = deque()
+        self._size = 0
+        self._in_use = 0
+        self._waiting = 0
+        self._checkouts = 0
+        self._timeouts = 0
+        self._created = 0
+        self._closed = 0
+        self._wait_histogram = [0] * (len(WAIT_BUCKETS_MS) + 1)
+
+    def _check_pid(self):
+        # Conexões herdadas do fork pertencem ao processo pai: descarta sem fechar o socket dele
+        if self._pid != os.getpid():
+            self._reset_state()
+
+    def _connect(self):
+        conn = mysql.connector.connect(**self.config)
+        with self._cond:
+            self._created += 1
+        return conn
+
+    def _close(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._closed += 1
+
+    def _alive(self, conn, idle_since):
+        if time.monotonic() - idle_since < self.ping_after:
+            return True
+        try:
+            conn.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    def _record_wait(self, espera):
+        self._wait_histogram[bisect_left(WAIT_BUCKETS_MS, espera * 1000)] += 1
+
+    def acquire(self):
+        inicio = time.monotonic()
+        prazo = inicio + self.timeout
+
+        while True:
+            with self._cond:
+                self._check_pid()
+
+                while not self._idle and self._size >= self.max_size + self.max_overflow:
+                    restante = prazo - time.monotonic()
+                    if restante <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeoutError(
+                            f"Nenhuma conexão livre em {self.timeout}s ({self._in_use} em uso)"
+                        )
+                    self._waiting += 1
+                    self._cond.wait(restante)
+                    self._waiting -= 1
+
+                if self._idle:
+                    # LIFO: reusa a conexão mais quente e deixa as frias expirarem
+                    conn, idle_since = self._idle.pop()
+                else:
+                    conn, idle_since = None, None
+                    self._size += 1
+                self._in_use += 1
+
+            if conn is None:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    self._forget()
+                    raise
+            elif not self._alive(conn, idle_since):
+                self._close(conn)
+                self._forget()
+                continue
+
+            with self._cond:
+                self._checkouts += 1
+                self._record_wait(time.monotonic() - inicio)
+            return conn
+
+    def _forget(self):
+        with self._cond:
+            self._size -= 1
+            self._in_use -= 1
+            self._cond.notify()
+
+    def release(self, conn, discard=False):
+        with self._cond:
+            if self._pid != os.getpid():
+                return
+
+            overflow = self._size > self.max_size
+            if not discard and not overflow:
+                self._in_use -= 1
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+                return
+
+        self._close(conn)
+        self._forget()
+
+    def reap(self):
+        limite = time.monotonic() - self.idle_timeout
+        expiradas = []
+
+        with self._cond:
+            self._check_pid()
+            # As mais antigas ficam no início da fila; mantém ao menos min_size abertas
+            while self._idle and self._size - len(expiradas) > self.min_size and self._idle[0][1] < limite:
+                expiradas.append(self._idle.popleft()[0])
+            self._size -= len(expiradas)
+
+        for conn in expiradas:
+            self._close(conn)
+
+    def prefill(self):
+        with self._cond:
+            self._check_pid()
+            faltando = self.min_size - self._size
+            self._size += max(faltando, 0)
+
+        for _ in range(max(faltando, 0)):
+            try:
+                conn = self._connect()
+            except Exception as e:
+                logging.error(f"Erro ao abrir conexão inicial do pool: {e}")
+                with self._cond:
+                    self._size -= 1
+                continue
+            with self._cond:
+                self._idle.appendleft((conn, time.monotonic()))
+                self._cond.notify()
+
+    def stats(self):
+        with self._cond:
+            self._check_pid()
+            histograma = {f"<={limite}ms": n for limite, n in zip(WAIT_BUCKETS_MS, self._wait_histogram)}
+            histograma[f">{WAIT_BUCKETS_MS[-1]}ms"] = self._wait_histogram[-1]
+            return {
+                "size": self._size,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "waiting": self._waiting,
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "max_overflow": self.max_overflow,
+                "checkouts": self._checkouts,
+                "timeouts": self._timeouts,
+                "created": self._created,
+                "closed": self._closed,
+                "wait_ms": histograma
+            }
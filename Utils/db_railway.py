@@ -1,52 +1,350 @@
-import mysql.connector
-from mysql.connector import pooling, Error
+from mysql.connector import Error, IntegrityError, InterfaceError, OperationalError, errorcode
+import logging
 import os
+import re
 from urllib.parse import urlparse
 from dotenv import load_dotenv
 from contextlib import contextmanager
+from flask import g, has_request_context, jsonify
+from Utils.background import every
+from Utils.db_pool import ConnectionPool
+from Utils.rate_limit_storage import MmapStorage, default_uri
 
 load_dotenv()
 
+def _config_from_url(url):
+    parsed_url = urlparse(url)
+    return {
+        'host': parsed_url.hostname,
+        'port': parsed_url.port,
+        'user': parsed_url.username,
+        'password': parsed_url.password,
+        'database': parsed_url.path.decode('utf-8').lstrip('/') if isinstance(parsed_url.path, bytes) else parsed_url.path.lstrip('/'),
+        'ssl_disabled': False,
+    }
+
 connection_url = os.getenv('CONN_URL')
-parsed_url = urlparse(connection_url)
-
-config = {
-    'host': parsed_url.hostname,
-    'port': parsed_url.port,
-    'user': parsed_url.username,
-    'password': parsed_url.password,
-    'database': parsed_url.path.decode('utf-8').lstrip('/') if isinstance(parsed_url.path, bytes) else parsed_url.path.lstrip('/'),
-    'ssl_disabled': False,
-}
-
-try:
-    connection_pool = pooling.MySQLConnectionPool(
-        pool_name="mylinks_pool",
-        pool_size=5,
-        pool_reset_session=True,
-        **config
+config = _config_from_url(connection_url)
+
+# Shards com usuarios, links, cliques e visitantes. CONN_URL continua guardando o diretório de
+# usuários e os tokens revogados; sem SHARD_URLS ele é o único shard e não há diretório
+shard_urls = [url.strip() for url in os.getenv('SHARD_URLS', '').split(',') if url.strip()]
+SHARDED = bool(shard_urls)
+# Ids intercalados: o shard i gera ids de links ≡ i + 1 (mod SHARD_ID_STRIDE), então ids copiados
+# numa migração nunca colidem com os que o shard de destino ainda vai gerar
+SHARD_ID_STRIDE = int(os.getenv('SHARD_ID_STRIDE', 64))
+
+# Réplica de leitura opcional (do banco de CONN_URL); sem REPLICA_URL todas as leituras vão para o primário
+replica_url = os.getenv('REPLICA_URL')
+REPLICA_STICKY_SECONDS = float(os.getenv('REPLICA_STICKY_SECONDS', 5))
+
+DB_POOL_MIN = int(os.getenv('DB_POOL_MIN', 1))
+DB_POOL_MAX = int(os.getenv('DB_POOL_MAX', 5))
+DB_POOL_OVERFLOW = int(os.getenv('DB_POOL_OVERFLOW', 5))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 5))
+DB_POOL_IDLE_TIMEOUT = float(os.getenv('DB_POOL_IDLE_TIMEOUT', 300))
+DB_POOL_PING_AFTER = float(os.getenv('DB_POOL_PING_AFTER', 30))
+
+def _new_pool(pool_config):
+    # Conexões abertas sob demanda: importar o módulo não conecta ao banco
+    return ConnectionPool(
+        pool_config,
+        min_size=DB_POOL_MIN,
+        max_size=DB_POOL_MAX,
+        max_overflow=DB_POOL_OVERFLOW,
+        timeout=DB_POOL_TIMEOUT,
+        idle_timeout=DB_POOL_IDLE_TIMEOUT,
+        ping_after=DB_POOL_PING_AFTER
     )
-    print("Connection pool criada com sucesso.")
-except Error as e:
-    print(f"Erro ao criar pool: {e}")
-    connection_pool = None
 
-def get_db():
-    if connection_pool:
-        return connection_pool.get_connection()
-    
-    return mysql.connector.connect(**config)
+connection_pool = _new_pool(config)
+
+# Pools próprios mesmo se um shard for o banco de CONN_URL: o passo do AUTO_INCREMENT não pode
+# valer para o diretório e os tokens revogados
+shard_pools = [
+    _new_pool({
+        **_config_from_url(url),
+        'init_command': f"SET SESSION auto_increment_increment = {SHARD_ID_STRIDE}, "
+                        f"auto_increment_offset = {shard + 1}"
+    })
+    for shard, url in enumerate(shard_urls)
+] or [connection_pool]
+
+replica_pool = None
+if replica_url:
+    # Só leituras: autocommit dispensa o COMMIT ao devolver a conexão
+    replica_pool = _new_pool({**_config_from_url(replica_url), 'autocommit': True})
+
+# Usuários com escrita recente, compartilhado entre os workers (a próxima requisição pode cair em outro);
+# sem fcntl (Windows) fica por processo
+recent_writers = MmapStorage(os.getenv('REPLICA_STICKY_URI', default_uri('mylinks-replica-sticky')))
+
+def _all_pools():
+    pools = [connection_pool] + [pool for pool in shard_pools if pool is not connection_pool]
+    return pools + ([replica_pool] if replica_pool is not None else [])
+
+def _reap():
+    for pool in _all_pools():
+        pool.reap()
+        pool.prefill()
+
+def _pool(shard):
+    return connection_pool if shard is None else shard_pools[shard]
+
+def _acquire(pool):
+    conn = pool.acquire()
+    every("db-pool-reaper", min(DB_POOL_IDLE_TIMEOUT, 60), _reap)
+    return conn
+
+def get_db(shard=None):
+    return _acquire(_pool(shard))
+
+def release_db(conn, discard=False, shard=None):
+    _pool(shard).release(conn, discard)
+
+class UnitOfWork:
+    """
+    Transação única de uma requisição HTTP.
+
+    A conexão de cada banco só é retirada do pool na primeira consulta a ele; todas as chamadas
+    aos repositórios dentro da requisição compartilham essas conexões e o commit (ou rollback)
+    acontece uma vez, no fim da requisição.
+    """
+
+    def __init__(self):
+        self.conns = {}
+        self.broken = set()
+        self.failed = False
+        self._after_commit = []
+
+    def connection(self, pool):
+        conn = self.conns.get(pool)
+        if conn is None:
+            conn = self.conns[pool] = _acquire(pool)
+        return conn
+
+    def after_commit(self, fn):
+        self._after_commit.append(fn)
+
+    def commit(self):
+        # Sem commit em duas fases entre bancos: o diretório (CONN_URL) vai por último, assim uma
+        # falha no meio deixa no máximo dados num shard que o diretório ainda não aponta
+        for pool in sorted(self.conns, key=lambda pool: pool is connection_pool):
+            try:
+                self.conns[pool].commit()
+            except (InterfaceError, OperationalError):
+                self.broken.add(pool)
+                raise
+        callbacks, self._after_commit = self._after_commit, []
+        for fn in callbacks:
+            fn()
+
+    def rollback(self):
+        self._after_commit = []
+        for pool, conn in self.conns.items():
+            if pool in self.broken:
+                continue
+            try:
+                conn.rollback()
+            except Error:
+                self.broken.add(pool)
+
+    def close(self):
+        # Chamado sem commit/rollback prévio (ex.: exceção no meio do caminho): desfaz tudo
+        if any(pool not in self.broken and conn.in_transaction for pool, conn in self.conns.items()):
+            self.rollback()
+        for pool, conn in self.conns.items():
+            pool.release(conn, pool in self.broken)
+        self.conns = {}
+        self._after_commit = []
+
+def _current_unit_of_work():
+    if not has_request_context():
+        return None
+    if "unit_of_work" not in g:
+        g.unit_of_work = UnitOfWork()
+    return g.unit_of_work
+
+def _active_unit_of_work():
+    uow = g.get("unit_of_work") if has_request_context() else None
+    return uow if uow is not None and uow.conns else None
+
+def on_commit(fn):
+    """Executa fn depois que o trabalho atual for confirmado (na hora, fora de uma requisição)."""
+    uow = _active_unit_of_work()
+    if uow is None:
+        fn()
+    else:
+        uow.after_commit(fn)
+
+def set_rollback_only():
+    """Faz a requisição terminar em rollback (ex.: uma operação em dois bancos falhou no meio)."""
+    uow = _active_unit_of_work()
+    if uow is not None:
+        uow.failed = True
+
+def checkpoint():
+    """
+    Confirma o que a requisição já fez e devolve as conexões ao pool.
+
+    Para antes de esperas longas (bcrypt, APIs externas): a próxima consulta retira outra conexão.
+    """
+    uow = _active_unit_of_work()
+    if uow is None or uow.failed:
+        return
+    uow.commit()
+    uow.close()
+
+def init_unit_of_work(app):
+    @app.after_request
+    def commit_unit_of_work(response):
+        uow = _active_unit_of_work()
+        if uow is None:
+            return response
+
+        # Commit antes de a resposta sair: uma falha aqui vira 500 em vez de sucesso falso
+        if uow.failed or response.status_code >= 500:
+            uow.rollback()
+            return response
+
+        try:
+            uow.commit()
+        except Error as e:
+            logging.error(f"Erro ao confirmar transação da requisição: {e}")
+            uow.rollback()
+            erro = jsonify({"error": "Erro ao salvar alterações"})
+            erro.status_code = 500
+            return erro
+        return response
+
+    @app.teardown_request
+    def close_unit_of_work(exc):
+        uow = g.pop("unit_of_work", None)
+        if uow is not None:
+            uow.close()
 
 @contextmanager
-def get_db_cursor(dictionary=True):
-    conn = get_db()
+def _shared_cursor(uow, pool, dictionary):
+    conn = uow.connection(pool)
     cursor = conn.cursor(dictionary=dictionary)
     try:
         yield cursor
-        conn.commit()
-    except Error as e:
-        conn.rollback()
-        raise e
+    except IntegrityError:
+        # Chave duplicada etc. só desfaz o próprio comando no InnoDB; o repositório decide o que fazer
+        raise
+    except Exception as e:
+        # Qualquer outra falha invalida a transação inteira da requisição
+        uow.failed = True
+        if isinstance(e, (InterfaceError, OperationalError)):
+            uow.broken.add(pool)
+        raise
     finally:
-        cursor.close()
-        conn.close()
+        if pool not in uow.broken:
+            if conn.unread_result:
+                conn.consume_results()
+            cursor.close()
+
+@contextmanager
+def get_db_cursor(dictionary=True, standalone=False, shard=None):
+    """
+    Cursor para uma operação no banco (CONN_URL, ou o shard informado).
+
+    Dentro de uma requisição, usa a conexão e a transação da requisição (UnitOfWork); fora dela,
+    ou com standalone=True, usa uma conexão própria e faz commit ao final do bloco.
+    """
+    pool = _pool(shard)
+    uow = None if standalone else _current_unit_of_work()
+    if uow is not None:
+        with _shared_cursor(uow, pool, dictionary) as cursor:
+            yield cursor
+        return
+
+    with _pooled_cursor(pool, _acquire(pool), dictionary) as cursor:
+        yield cursor
+
+@contextmanager
+def _pooled_cursor(pool, conn, dictionary, commit=True):
+    cursor = None
+    discard = False
+    try:
+        cursor = conn.cursor(dictionary=dictionary)
+        yield cursor
+        if commit:
+            conn.commit()
+    except (InterfaceError, OperationalError):
+        # Conexão possivelmente quebrada (rede, servidor reiniciado): não volta para o pool
+        discard = True
+        raise
+    except Exception:
+        try:
+            conn.rollback()
+        except Error:
+            discard = True
+        raise
+    finally:
+        if cursor is not None and not discard:
+            if conn.unread_result:
+                conn.consume_results()
+            cursor.close()
+        pool.release(conn, discard)
+
+def mark_written(usuario_id):
+    # Leituras desse usuário ficam no primário até a réplica ter alcançado a escrita
+    if replica_pool is not None:
+        recent_writers.set(f"escrita:{usuario_id}", 1, REPLICA_STICKY_SECONDS)
+
+def wrote_recently(usuario_id):
+    return recent_writers.get(f"escrita:{usuario_id}") > 0
+
+def _use_replica(pool, usuario_id=None):
+    if replica_pool is None or pool is not connection_pool:
+        return False
+    # A requisição já usa o primário (talvez com escritas não confirmadas): continua nele
+    uow = _active_unit_of_work()
+    if uow is not None and pool in uow.conns:
+        return False
+    return usuario_id is None or not wrote_recently(usuario_id)
+
+@contextmanager
+def get_read_cursor(dictionary=True, usuario_id=None, standalone=False, shard=None):
+    """
+    Cursor para consultas somente leitura, servidas pela réplica quando existe uma.
+
+    Com usuario_id, as leituras desse usuário ficam no primário por REPLICA_STICKY_SECONDS
+    depois de uma escrita (read-your-writes). Se a réplica não der conexão, usa o primário.
+    """
+    if _use_replica(_pool(shard), usuario_id):
+        try:
+            conn = replica_pool.acquire()
+        except Error as e:
+            logging.warning(f"Réplica indisponível, lendo do primário: {e}")
+        else:
+            with _pooled_cursor(replica_pool, conn, dictionary, commit=False) as cursor:
+                yield cursor
+            return
+
+    with get_db_cursor(dictionary, standalone, shard) as cursor:
+        yield cursor
+
+def replica_read(fetch, owner, dictionary=True, shard=None):
+    """
+    Executa fetch(cursor) na réplica para buscas que não são pelo usuario_id (username, e-mail, link).
+
+    O resultado é refeito no primário quando vem vazio (a linha pode ainda não ter replicado) ou
+    quando owner(resultado), o dono da linha, escreveu há pouco.
+    """
+    if _use_replica(_pool(shard)):
+        with get_read_cursor(dictionary, shard=shard) as cursor:
+            resultado = fetch(cursor)
+        if resultado is not None and not wrote_recently(owner(resultado)):
+            return resultado
+
+    with get_db_cursor(dictionary, shard=shard) as cursor:
+        return fetch(cursor)
+
+def duplicate_key(e):
+    """Chave UNIQUE violada por e (ex.: 'usuarios.email'), ou None se o erro é outro."""
+    if getattr(e, "errno", None) != errorcode.ER_DUP_ENTRY:
+        return None
+    match = re.search(r"for key '([^']+)'", e.msg or "")
+    return match.group(1) if match else e.msg
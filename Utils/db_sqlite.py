@@ -0,0 +1,427 @@
+import logging
+import os
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime
+from dotenv import load_dotenv
+from flask import g, has_request_context, jsonify
+
+load_dotenv()
+
+# Banco embutido num arquivo local (DB_BACKEND=sqlite): um único nó, sem réplica nem shards
+SQLITE_PATH = os.getenv('SQLITE_PATH', 'mylinks.db')
+SQLITE_BUSY_TIMEOUT = float(os.getenv('SQLITE_BUSY_TIMEOUT', 5))
+DB_POOL_MAX = int(os.getenv('DB_POOL_MAX', 5))
+
+SHARDED = False
+SHARD_ID_STRIDE = 1
+
+# Mesmo modelo do README; COLLATE NOCASE reproduz a comparação sem maiúsculas/minúsculas do MySQL
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS usuarios (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username VARCHAR(255) UNIQUE COLLATE NOCASE,
+    email VARCHAR(255) UNIQUE COLLATE NOCASE,
+    senha VARCHAR(255) NOT NULL,
+    foto_perfil VARCHAR(255),
+    versao INT NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS links (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    usuario_id INT,
+    titulo VARCHAR(100),
+    url VARCHAR(150),
+    ordem INT,
+    FOREIGN KEY (usuario_id) REFERENCES usuarios(id) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS idx_links_usuario_ordem ON links (usuario_id, ordem);
+
+CREATE TABLE IF NOT EXISTS link_cliques (
+    link_id INT PRIMARY KEY,
+    total BIGINT NOT NULL DEFAULT 0,
+    FOREIGN KEY (link_id) REFERENCES links(id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS link_cliques_hora (
+    link_id INT,
+    usuario_id INT,
+    hora DATETIME,
+    total INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (link_id, hora),
+    FOREIGN KEY (link_id) REFERENCES links(id) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS idx_cliques_hora_usuario ON link_cliques_hora (usuario_id, hora);
+
+CREATE TABLE IF NOT EXISTS link_cliques_dia (
+    link_id INT,
+    usuario_id INT,
+    dia DATE,
+    total INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (link_id, dia),
+    FOREIGN KEY (link_id) REFERENCES links(id) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS idx_cliques_dia_usuario ON link_cliques_dia (usuario_id, dia);
+
+CREATE TABLE IF NOT EXISTS perfil_visitantes (
+    usuario_id INT,
+    dia DATE,
+    sketch BLOB NOT NULL,
+    PRIMARY KEY (usuario_id, dia),
+    FOREIGN KEY (usuario_id) REFERENCES usuarios(id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS tokens_revogados (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    jti VARCHAR(64) NOT NULL UNIQUE,
+    expira_em DATETIME NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_tokens_revogados_expira ON tokens_revogados (expira_em);
+"""
+
+# Datas gravadas como texto ISO: DATE(hora) e comparações de intervalo funcionam direto no SQL
+sqlite3.register_adapter(datetime, lambda valor: valor.isoformat(" "))
+sqlite3.register_adapter(date, lambda valor: valor.isoformat())
+sqlite3.register_converter("DATETIME", lambda valor: datetime.fromisoformat(valor.decode()))
+sqlite3.register_converter("DATE", lambda valor: date.fromisoformat(valor.decode()))
+
+def _regexp(padrao, valor):
+    return valor is not None and re.search(padrao, valor, re.IGNORECASE) is not None
+
+def _dict_row(cursor, row):
+    return {coluna[0]: valor for coluna, valor in zip(cursor.description, row)}
+
+class SQLitePool:
+    """
+    Conexões com o arquivo SQLite reaproveitadas entre requisições (até ``max_idle`` ociosas).
+
+    Não há limite de conexões em uso: no modo WAL as leituras não bloqueiam e as escritas são
+    serializadas pelo próprio SQLite, que espera até SQLITE_BUSY_TIMEOUT pela trava.
+    """
+
+    def __init__(self, path, max_idle=5):
+        self.path = path
+        self.max_idle = max_idle
+        self._lock = threading.Lock()
+        self._schema_lock = threading.Lock()
+        self._reset_state()
+
+    def _reset_state(self):
+        self._pid = os.getpid()
+        self._idle = []
+        self._schema_ready = False
+        self._in_use = 0
+        self._checkouts = 0
+        self._created = 0
+        self._closed = 0
+
+    def _check_pid(self):
+        # Conexões SQLite não podem atravessar um fork: cada processo abre as suas
+        if self._pid != os.getpid():
+            self._reset_state()
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.path,
+            timeout=SQLITE_BUSY_TIMEOUT,
+            isolation_level=None,
+            check_same_thread=False,
+            detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES
+        )
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute("PRAGMA foreign_keys = ON")
+        conn.create_function("REGEXP", 2, _regexp, deterministic=True)
+
+        # Esquema criado pela primeira conexão do processo; as demais esperam ele ficar pronto
+        with self._schema_lock:
+            if not self._schema_ready:
+                conn.executescript(SCHEMA)
+                self._schema_ready = True
+
+        with self._lock:
+            self._created += 1
+        return conn
+
+    def acquire(self):
+        with self._lock:
+            self._check_pid()
+            conn = self._idle.pop() if self._idle else None
+            self._in_use += 1
+            self._checkouts += 1
+
+        if conn is None:
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._lock:
+                    self._in_use -= 1
+                raise
+        return conn
+
+    def release(self, conn, discard=False):
+        with self._lock:
+            if self._pid != os.getpid():
+                return
+            self._in_use -= 1
+            if not discard and len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+            self._closed += 1
+        conn.close()
+
+    def stats(self):
+        with self._lock:
+            self._check_pid()
+            return {
+                "size": self._in_use + len(self._idle),
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "max_idle": self.max_idle,
+                "checkouts": self._checkouts,
+                "created": self._created,
+                "closed": self._closed
+            }
+
+connection_pool = SQLitePool(SQLITE_PATH, max_idle=DB_POOL_MAX)
+replica_pool = None
+shard_pools = [connection_pool]
+
+class _Cursor:
+    """
+    Cursor com a mesma interface do mysql.connector usada pelos repositórios.
+
+    Traduz os placeholders %s, INSERT IGNORE e FOR UPDATE. Sem travas por linha no SQLite, a
+    primeira escrita (ou SELECT ... FOR UPDATE) abre a transação com BEGIN IMMEDIATE, que trava
+    as escritas do banco inteiro até o commit. Leituras anteriores rodam sem transação, então
+    nunca é preciso promover uma leitura a escrita (o que falharia com SQLITE_BUSY).
+    """
+
+    def __init__(self, conn, dictionary):
+        self._conn = conn
+        self._cursor = conn.cursor()
+        if dictionary:
+            self._cursor.row_factory = _dict_row
+
+    def _prepare(self, sql):
+        sql = sql.replace("%s", "?")
+        escrita = not sql.lstrip().upper().startswith("SELECT")
+        if sql.rstrip().upper().endswith(" FOR UPDATE"):
+            sql = sql.rstrip()[:-len(" FOR UPDATE")]
+            escrita = True
+        if sql.lstrip().upper().startswith("INSERT IGNORE "):
+            sql = "INSERT OR IGNORE " + sql.lstrip()[len("INSERT IGNORE "):]
+
+        if escrita and not self._conn.in_transaction:
+            self._conn.execute("BEGIN IMMEDIATE")
+        return sql
+
+    def execute(self, sql, params=()):
+        self._cursor.execute(self._prepare(sql), params or ())
+
+    def executemany(self, sql, params):
+        self._cursor.executemany(self._prepare(sql), params)
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def fetchmany(self, size):
+        return self._cursor.fetchmany(size)
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    def close(self):
+        self._cursor.close()
+
+class UnitOfWork:
+    """
+    Transação única de uma requisição HTTP, como a de db_railway, sobre uma só conexão.
+
+    A conexão sai do pool na primeira consulta; a transação começa na primeira escrita e é
+    confirmada (ou desfeita) uma vez, no fim da requisição.
+    """
+
+    def __init__(self):
+        self.conn = None
+        self.failed = False
+        self._after_commit = []
+
+    def connection(self):
+        if self.conn is None:
+            self.conn = connection_pool.acquire()
+        return self.conn
+
+    def after_commit(self, fn):
+        self._after_commit.append(fn)
+
+    def commit(self):
+        if self.conn.in_transaction:
+            self.conn.commit()
+        callbacks, self._after_commit = self._after_commit, []
+        for fn in callbacks:
+            fn()
+
+    def rollback(self):
+        self._after_commit = []
+        if self.conn.in_transaction:
+            self.conn.rollback()
+
+    def close(self):
+        if self.conn is not None:
+            if self.conn.in_transaction:
+                self.conn.rollback()
+            connection_pool.release(self.conn)
+        self.conn = None
+        self._after_commit = []
+
+def _current_unit_of_work():
+    if not has_request_context():
+        return None
+    if "unit_of_work" not in g:
+        g.unit_of_work = UnitOfWork()
+    return g.unit_of_work
+
+def _active_unit_of_work():
+    uow = g.get("unit_of_work") if has_request_context() else None
+    return uow if uow is not None and uow.conn is not None else None
+
+def on_commit(fn):
+    """Executa fn depois que o trabalho atual for confirmado (na hora, fora de uma requisição)."""
+    uow = _active_unit_of_work()
+    if uow is None:
+        fn()
+    else:
+        uow.after_commit(fn)
+
+def set_rollback_only():
+    """Faz a requisição terminar em rollback."""
+    uow = _active_unit_of_work()
+    if uow is not None:
+        uow.failed = True
+
+def checkpoint():
+    """Confirma o que a requisição já fez e libera a trava de escrita antes de esperas longas (bcrypt)."""
+    uow = _active_unit_of_work()
+    if uow is None or uow.failed:
+        return
+    uow.commit()
+    uow.close()
+
+def init_unit_of_work(app):
+    @app.after_request
+    def commit_unit_of_work(response):
+        uow = _active_unit_of_work()
+        if uow is None:
+            return response
+
+        if uow.failed or response.status_code >= 500:
+            uow.rollback()
+            return response
+
+        try:
+            uow.commit()
+        except sqlite3.Error as e:
+            logging.error(f"Erro ao confirmar transação da requisição: {e}")
+            uow.rollback()
+            erro = jsonify({"error": "Erro ao salvar alterações"})
+            erro.status_code = 500
+            return erro
+        return response
+
+    @app.teardown_request
+    def close_unit_of_work(exc):
+        uow = g.pop("unit_of_work", None)
+        if uow is not None:
+            uow.close()
+
+@contextmanager
+def _shared_cursor(uow, dictionary):
+    cursor = _Cursor(uow.connection(), dictionary)
+    try:
+        yield cursor
+    except sqlite3.IntegrityError:
+        # Como no InnoDB, a violação só desfaz o próprio comando; o repositório decide o que fazer
+        raise
+    except Exception:
+        uow.failed = True
+        raise
+    finally:
+        cursor.close()
+
+@contextmanager
+def _pooled_cursor(dictionary):
+    conn = connection_pool.acquire()
+    cursor = None
+    try:
+        cursor = _Cursor(conn, dictionary)
+        yield cursor
+        if conn.in_transaction:
+            conn.commit()
+    except Exception:
+        if conn.in_transaction:
+            conn.rollback()
+        raise
+    finally:
+        if cursor is not None:
+            cursor.close()
+        connection_pool.release(conn)
+
+@contextmanager
+def get_db_cursor(dictionary=True, standalone=False, shard=None):
+    """
+    Cursor para uma operação no banco.
+
+    Dentro de uma requisição, usa a conexão e a transação da requisição (UnitOfWork); fora dela,
+    ou com standalone=True, usa uma conexão própria e faz commit ao final do bloco.
+    """
+    uow = None if standalone else _current_unit_of_work()
+    if uow is not None:
+        with _shared_cursor(uow, dictionary) as cursor:
+            yield cursor
+        return
+
+    with _pooled_cursor(dictionary) as cursor:
+        yield cursor
+
+@contextmanager
+def get_read_cursor(dictionary=True, usuario_id=None, standalone=False, shard=None):
+    """
+    Cursor para consultas somente leitura.
+
+    Se a requisição já usa uma conexão, lê por ela (e vê as próprias escritas); senão usa outra
+    conexão do pool, sem transação: no modo WAL a leitura não espera pelas escritas em curso.
+    """
+    uow = None if standalone else _active_unit_of_work()
+    if uow is not None:
+        with _shared_cursor(uow, dictionary) as cursor:
+            yield cursor
+        return
+
+    with _pooled_cursor(dictionary) as cursor:
+        yield cursor
+
+def replica_read(fetch, owner, dictionary=True, shard=None):
+    # Sem réplica: o arquivo local já tem todas as escritas confirmadas
+    with get_read_cursor(dictionary) as cursor:
+        return fetch(cursor)
+
+def mark_written(usuario_id):
+    pass
+
+def duplicate_key(e):
+    """Chave UNIQUE violada por e (ex.: 'usuarios.email'), ou None se o erro é outro."""
+    match = re.match(r"UNIQUE constraint failed: (.+)", str(e))
+    if isinstance(e, sqlite3.IntegrityError) and match:
+        return match.group(1)
+    return None
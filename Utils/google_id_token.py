@@ -0,0 +1,113 @@
+import os
+import re
+import threading
+import time
+import jwt
+from dotenv import load_dotenv
+from Utils import http_client
+from Utils.background import run_in_background
+
+load_dotenv()
+
+GOOGLE_JWKS_URL = os.getenv("GOOGLE_JWKS_URL", "https://www.googleapis.com/oauth2/v3/certs")
+GOOGLE_ISSUERS = ["accounts.google.com", "https://accounts.google.com"]
+
+JWKS_DEFAULT_MAX_AGE = 300
+JWKS_REFRESH_MARGIN = 0.1
+JWKS_MAX_STALE = 24 * 3600
+JWKS_MIN_REFETCH_INTERVAL = 60
+
+class JWKSCache:
+    def __init__(self, url):
+        self.url = url
+        self._keys = {}
+        self._fetched_at = 0.0
+        self._expires_at = 0.0
+        self._last_attempt = 0.0
+        self._refreshing = False
+        self._lock = threading.Lock()
+
+    def _max_age(self, response):
+        match = re.search(r"max-age=(\d+)", response.headers.get("Cache-Control", ""))
+        max_age = int(match.group(1)) if match else JWKS_DEFAULT_MAX_AGE
+
+        # Resposta vinda de um cache intermediário já consumiu parte da validade
+        age = response.headers.get("Age", "")
+        if age.isdigit():
+            max_age -= int(age)
+        return max(max_age, 0)
+
+    def refresh(self):
+        with self._lock:
+            self._last_attempt = time.monotonic()
+
+        try:
+            response = http_client.get(self.url)
+            response.raise_for_status()
+            keys = {
+                jwk["kid"]: jwt.PyJWK(jwk)
+                for jwk in response.json().get("keys", [])
+                if jwk.get("kid") and jwk.get("use", "sig") == "sig"
+            }
+            agora = time.monotonic()
+
+            with self._lock:
+                self._keys = keys
+                self._fetched_at = agora
+                self._expires_at = agora + self._max_age(response)
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        run_in_background(self.refresh)
+
+    def get_key(self, kid):
+        agora = time.monotonic()
+        with self._lock:
+            key = self._keys.get(kid)
+            expires_at = self._expires_at
+            validade = expires_at - self._fetched_at
+            ultima_tentativa = self._last_attempt
+
+        if key is not None:
+            # Perto de expirar: renova em segundo plano e continua servindo a chave atual
+            if agora >= expires_at - validade * JWKS_REFRESH_MARGIN:
+                self._refresh_in_background()
+            if agora < expires_at + JWKS_MAX_STALE:
+                return key
+
+        # kid desconhecido (rotação do Google) ou cache vazio: busca na hora, com limite de frequência
+        if key is None and self._keys and agora - ultima_tentativa < JWKS_MIN_REFETCH_INTERVAL:
+            raise jwt.InvalidTokenError("Chave de assinatura desconhecida")
+
+        self.refresh()
+        with self._lock:
+            key = self._keys.get(kid)
+        if key is None:
+            raise jwt.InvalidTokenError("Chave de assinatura desconhecida")
+        return key
+
+google_jwks = JWKSCache(GOOGLE_JWKS_URL)
+
+def verify_id_token(token, audience, jwks=google_jwks):
+    header = jwt.get_unverified_header(token)
+    key = jwks.get_key(header.get("kid"))
+
+    claims = jwt.decode(
+        token,
+        key.key,
+        algorithms=["RS256"],
+        audience=audience,
+        issuer=GOOGLE_ISSUERS,
+        options={"require": ["exp", "iat", "iss", "aud", "sub"]},
+        leeway=30
+    )
+
+    if claims.get("email") and claims.get("email_verified") is not True:
+        raise jwt.InvalidTokenError("E-mail não verificado pelo Google")
+    return claims
@@ -0,0 +1,22 @@
+from flask import request, jsonify, make_response
+
+PUBLIC_CACHE_CONTROL = "public, no-cache"
+PRIVATE_CACHE_CONTROL = "private, no-cache"
+
+def make_etag(usuario_id, versao):
+    return f"{usuario_id}-{versao}"
+
+def is_not_modified(etag):
+    return request.if_none_match.contains_weak(etag)
+
+def not_modified_response(etag, cache_control):
+    response = make_response("", 304)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = cache_control
+    return response
+
+def etag_response(data, etag, cache_control):
+    response = jsonify(data)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = cache_control
+    return response
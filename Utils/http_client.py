@@ -0,0 +1,192 @@
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+
+load_dotenv()
+
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", 3.05))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", 10))
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", 10))
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", 2))
+HTTP_BACKOFF = float(os.getenv("HTTP_BACKOFF", 0.2))
+HTTP_BACKOFF_MAX = 2.0
+BREAKER_FAILURES = int(os.getenv("HTTP_BREAKER_FAILURES", 5))
+BREAKER_RESET = float(os.getenv("HTTP_BREAKER_RESET", 30))
+LATENCY_SAMPLES = 256
+
+DEFAULT_TIMEOUT = (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+RETRY_STATUS = {429, 502, 503, 504}
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    def __init__(self, host):
+        super().__init__(f"Circuito aberto para {host}")
+        self.host = host
+
+class CircuitBreaker:
+    def __init__(self, failures=BREAKER_FAILURES, reset_timeout=BREAKER_RESET):
+        self.failures = failures
+        self.reset_timeout = reset_timeout
+        self._consecutive = 0
+        self._opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                return "half-open"
+            return "open"
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+            # Meio aberto: uma única requisição de teste decide se fecha ou reabre
+            if self._trial:
+                return False
+            self._trial = True
+            return True
+
+    def cancel_trial(self):
+        # A requisição de teste falhou antes de falar com o host: libera outra tentativa
+        with self._lock:
+            self._trial = False
+
+    def record(self, sucesso):
+        with self._lock:
+            self._trial = False
+            if sucesso:
+                self._consecutive = 0
+                self._opened_at = None
+                return
+
+            self._consecutive += 1
+            if self._opened_at is not None or self._consecutive >= self.failures:
+                self._opened_at = time.monotonic()
+
+class HostStats:
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.rejected = 0
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+
+    def record(self, latencia, sucesso):
+        self.requests += 1
+        if not sucesso:
+            self.errors += 1
+        self._latencies.append(latencia)
+
+    def to_dict(self):
+        amostras = sorted(self._latencies)
+
+        def percentil(p):
+            if not amostras:
+                return None
+            return round(amostras[min(len(amostras) - 1, int(p * len(amostras)))] * 1000, 1)
+
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "retries": self.retries,
+            "rejected": self.rejected,
+            "p50_ms": percentil(0.5),
+            "p95_ms": percentil(0.95),
+            "max_ms": round(amostras[-1] * 1000, 1) if amostras else None
+        }
+
+def _build_session():
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+# Conexões keep-alive reaproveitadas entre requisições (um pool por host)
+session = _build_session()
+
+_hosts = {}
+_lock = threading.Lock()
+
+def _host(host):
+    with _lock:
+        if host not in _hosts:
+            _hosts[host] = (CircuitBreaker(), HostStats())
+        return _hosts[host]
+
+def _backoff(tentativa):
+    # Full jitter: espalha as novas tentativas de vários workers no tempo
+    time.sleep(random.uniform(0, min(HTTP_BACKOFF_MAX, HTTP_BACKOFF * 2 ** tentativa)))
+
+def request(method, url, retries=HTTP_RETRIES, **kwargs):
+    kwargs.setdefault("timeout", DEFAULT_TIMEOUT)
+    method = method.upper()
+    host = urlparse(url).netloc
+    breaker, stats = _host(host)
+
+    for tentativa in range(retries + 1):
+        if not breaker.allow():
+            with _lock:
+                stats.rejected += 1
+            raise CircuitOpenError(host)
+
+        inicio = time.monotonic()
+        try:
+            response = session.request(method, url, **kwargs)
+        except requests.exceptions.RequestException as e:
+            latencia = time.monotonic() - inicio
+            with _lock:
+                stats.record(latencia, False)
+            breaker.record(False)
+
+            # Sem idempotência, só repete quando a requisição certamente não saiu (timeout de conexão)
+            repetivel = method in IDEMPOTENT_METHODS or isinstance(e, requests.exceptions.ConnectTimeout)
+            if tentativa >= retries or not repetivel:
+                raise
+            logging.warning(f"Falha em {method} {host} ({e}); nova tentativa")
+        except Exception:
+            # Erro local (argumentos inválidos, URL malformada): não conta contra o host, mas uma
+            # requisição de teste presa deixaria o circuito recusando o host para sempre
+            breaker.cancel_trial()
+            raise
+        else:
+            latencia = time.monotonic() - inicio
+            falhou = response.status_code >= 500
+            with _lock:
+                stats.record(latencia, not falhou)
+            breaker.record(not falhou)
+
+            if response.status_code not in RETRY_STATUS or method not in IDEMPOTENT_METHODS or tentativa >= retries:
+                return response
+            response.close()
+
+        with _lock:
+            stats.retries += 1
+        _backoff(tentativa)
+
+def get(url, **kwargs):
+    return request("GET", url, **kwargs)
+
+def post(url, **kwargs):
+    return request("POST", url, **kwargs)
+
+def stats():
+    with _lock:
+        hosts = dict(_hosts)
+    return {
+        host: {**host_stats.to_dict(), "circuit": breaker.state()}
+        for host, (breaker, host_stats) in hosts.items()
+    }
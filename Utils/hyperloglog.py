@@ -0,0 +1,49 @@
+import hashlib
+import math
+
+class HyperLogLog:
+    def __init__(self, precision=12, registers=None):
+        self.precision = precision
+        self.m = 1 << precision
+        self.registers = bytearray(registers) if registers is not None else bytearray(self.m)
+
+        if len(self.registers) != self.m:
+            raise ValueError("Quantidade de registradores incompatível com a precisão")
+
+    @classmethod
+    def from_bytes(cls, data):
+        precision = len(data).bit_length() - 1
+        return cls(precision, data)
+
+    def to_bytes(self):
+        return bytes(self.registers)
+
+    def add(self, value):
+        if isinstance(value, str):
+            value = value.encode("utf-8")
+
+        h = int.from_bytes(hashlib.blake2b(value, digest_size=8).digest(), "big")
+        bits = 64 - self.precision
+        index = h >> bits
+        resto = h & ((1 << bits) - 1)
+        rank = bits - resto.bit_length() + 1
+
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        if other.m != self.m:
+            raise ValueError("Não é possível unir sketches de precisões diferentes")
+
+        self.registers = bytearray(max(a, b) for a, b in zip(self.registers, other.registers))
+        return self
+
+    def count(self):
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        estimativa = alpha * self.m * self.m / sum(2.0 ** -r for r in self.registers)
+
+        zeros = self.registers.count(0)
+        if estimativa <= 2.5 * self.m and zeros:
+            estimativa = self.m * math.log(self.m / zeros)
+
+        return round(estimativa)
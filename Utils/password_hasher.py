@@ -0,0 +1,103 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from math import ceil
+import bcrypt
+from dotenv import load_dotenv
+from werkzeug.exceptions import ServiceUnavailable
+
+load_dotenv()
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+# Cada worker do gunicorn tem o próprio pool: os núcleos são divididos entre eles (WEB_CONCURRENCY,
+# a mesma variável que o gunicorn usa para o número de workers)
+WEB_CONCURRENCY = max(1, int(os.getenv("WEB_CONCURRENCY", 1)))
+BCRYPT_WORKERS = int(os.getenv("BCRYPT_WORKERS", max(1, (os.cpu_count() or 1) // WEB_CONCURRENCY)))
+BCRYPT_QUEUE_SIZE = int(os.getenv("BCRYPT_QUEUE_SIZE", BCRYPT_WORKERS * 4))
+BCRYPT_TIMEOUT = float(os.getenv("BCRYPT_TIMEOUT", 10))
+
+_executor = None
+_executor_pid = None
+_slots = None
+_lock = threading.Lock()
+_duracao_media = 0.25
+
+def _hash(senha, rounds):
+    return bcrypt.hashpw(senha.encode("utf-8"), bcrypt.gensalt(rounds)).decode("utf-8")
+
+def _check(senha, hashed):
+    try:
+        return bcrypt.checkpw(senha.encode("utf-8"), hashed.encode("utf-8"))
+    except ValueError:
+        # Senha gravada sem hash bcrypt (ex.: contas criadas pelo login com Google)
+        return False
+
+def _get_executor():
+    global _executor, _executor_pid, _slots
+
+    with _lock:
+        # Mesmo padrão do executor de segundo plano: um pool por processo do gunicorn
+        if _executor is None or _executor_pid != os.getpid():
+            metodo = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            _executor = ProcessPoolExecutor(
+                max_workers=BCRYPT_WORKERS,
+                mp_context=multiprocessing.get_context(metodo)
+            )
+            _slots = threading.BoundedSemaphore(BCRYPT_WORKERS + BCRYPT_QUEUE_SIZE)
+            _executor_pid = os.getpid()
+        return _executor, _slots
+
+def _discard(executor):
+    global _executor
+
+    # Um processo morreu (ex.: OOM): o próximo pedido cria um pool novo
+    with _lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False)
+
+def _retry_after():
+    fila = BCRYPT_WORKERS + BCRYPT_QUEUE_SIZE
+    return max(1, ceil(fila * _duracao_media / BCRYPT_WORKERS))
+
+def _run(fn, *args):
+    global _duracao_media
+
+    executor, slots = _get_executor()
+    if not slots.acquire(blocking=False):
+        raise ServiceUnavailable("Serviço sobrecarregado, tente novamente em instantes", retry_after=_retry_after())
+
+    inicio = time.monotonic()
+    try:
+        future = executor.submit(fn, *args)
+    except Exception:
+        slots.release()
+        raise
+
+    # O slot só volta quando o processo termina, mesmo que esta requisição desista antes
+    future.add_done_callback(lambda _: slots.release())
+
+    try:
+        resultado = future.result(timeout=BCRYPT_TIMEOUT)
+    except TimeoutError:
+        raise ServiceUnavailable("Serviço sobrecarregado, tente novamente em instantes", retry_after=_retry_after())
+    except BrokenProcessPool:
+        _discard(executor)
+        raise ServiceUnavailable("Serviço temporariamente indisponível", retry_after=1)
+
+    _duracao_media = 0.8 * _duracao_media + 0.2 * (time.monotonic() - inicio)
+    return resultado
+
+def hash_password(senha):
+    return _run(_hash, senha, BCRYPT_ROUNDS)
+
+def check_password(senha, hashed):
+    return _run(_check, senha, hashed)
+
+def needs_rehash(hashed):
+    # Formato $2b$<custo>$<salt+hash>
+    partes = hashed.split("$")
+    return len(partes) < 4 or not partes[2].isdigit() or int(partes[2]) != BCRYPT_ROUNDS
@@ -0,0 +1,338 @@
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from math import floor
+from urllib.parse import urlparse, parse_qs
+from limits.errors import ConfigurationError
+from limits.storage import Storage
+from limits.storage.base import SlidingWindowCounterSupport, TimestampedSlidingWindow
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+MAGIC = b"MLRL0001"
+CHANGES_MAGIC = b"MLCH0001"
+HEADER = struct.Struct("<8sQ")
+SLOT = struct.Struct("<Qdq")
+MARK = struct.Struct("<Q")
+PROBE = 16
+DEFAULT_SLOTS = 65536
+
+def _map_file(path, size, magic, slots):
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+    fcntl.flock(fd, fcntl.LOCK_EX)
+    try:
+        if os.fstat(fd).st_size != size:
+            os.ftruncate(fd, 0)
+            os.ftruncate(fd, size)
+        mapa = mmap.mmap(fd, size)
+        if HEADER.unpack_from(mapa, 0) != (magic, slots):
+            mapa[:] = bytes(size)
+            HEADER.pack_into(mapa, 0, magic, slots)
+    finally:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    return fd, mapa
+
+def _key_hash(key):
+    h = int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little")
+    return h or 1
+
+def default_uri(nome):
+    # Sem fcntl (Windows) não há como travar o arquivo entre processos: contadores por processo
+    if fcntl is None:
+        return "memory://"
+    return f"mmap://{os.path.join(tempfile.gettempdir(), nome)}"
+
+class MmapStorage(Storage, SlidingWindowCounterSupport, TimestampedSlidingWindow):
+    """
+    Contadores de rate limit compartilhados entre os workers do gunicorn através de um
+    arquivo mapeado em memória (``mmap:///caminho/arquivo?slots=65536``).
+
+    O arquivo é uma tabela de hash de tamanho fixo: cada slot guarda o hash da chave, o
+    instante de expiração e o contador. Uma chave só pode ocupar um de PROBE slots
+    consecutivos; quando todos estão ocupados por chaves válidas, a que expira primeiro é
+    descartada, então o espaço nunca cresce além de ``slots`` chaves.
+
+    Com ``memory://`` a mesma tabela fica num mapa anônimo de cada processo, sem arquivo nem
+    fcntl: serve aos usos diretos (acquire_token, get/set) onde o mmap não está disponível.
+    """
+
+    STORAGE_SCHEME = ["mmap"]
+
+    def __init__(self, uri=None, wrap_exceptions=False, **options):
+        parsed = urlparse(uri)
+        if parsed.scheme == "memory":
+            self.path = None
+        else:
+            if fcntl is None:
+                raise ConfigurationError("mmap:// requer fcntl (apenas sistemas POSIX); use memory://")
+            self.path = parsed.path
+            if not self.path:
+                raise ConfigurationError("Informe o caminho do arquivo: mmap:///caminho/arquivo")
+
+        query = parse_qs(parsed.query)
+        self.slots = int(options.get("slots", query.get("slots", [DEFAULT_SLOTS])[0]))
+        self.size = HEADER.size + self.slots * SLOT.size
+
+        self._lock = threading.Lock()
+        self._pid = None
+        self._fd = None
+        self._map = None
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+
+    @property
+    def base_exceptions(self):
+        return (OSError, ValueError)
+
+    def _open(self):
+        # Descritores herdados do fork compartilham o flock: cada processo abre o seu
+        if self._pid == os.getpid():
+            return
+
+        if self.path is None:
+            # Mapa anônimo novo em cada processo: nada compartilhado com o pai depois do fork
+            mapa = mmap.mmap(-1, self.size)
+            HEADER.pack_into(mapa, 0, MAGIC, self.slots)
+            self._map, self._pid = mapa, os.getpid()
+            return
+
+        self._fd, self._map = _map_file(self.path, self.size, MAGIC, self.slots)
+        self._pid = os.getpid()
+
+    def _locked(self, fn, *args):
+        with self._lock:
+            self._open()
+            if self._fd is None:
+                return fn(*args)
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                return fn(*args)
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _hash(self, key):
+        return _key_hash(key)
+
+    def _offset(self, index):
+        return HEADER.size + (index % self.slots) * SLOT.size
+
+    def _find(self, h, now, create):
+        inicio = h % self.slots
+        livre = None
+        vitima = None
+
+        for i in range(PROBE):
+            offset = self._offset(inicio + i)
+            slot_hash, expira, contador = SLOT.unpack_from(self._map, offset)
+            if slot_hash == h:
+                if expira <= now:
+                    return offset, 0, 0.0
+                return offset, contador, expira
+            if livre is None and (slot_hash == 0 or expira <= now):
+                livre = offset
+            if vitima is None or expira < vitima[1]:
+                vitima = (offset, expira)
+
+        if not create:
+            return None, 0, 0.0
+        return (livre if livre is not None else vitima[0]), 0, 0.0
+
+    def _incr(self, key, expiry, amount):
+        now = time.time()
+        h = self._hash(key)
+        offset, contador, expira = self._find(h, now, True)
+        if not expira:
+            expira = now + expiry
+        contador += amount
+        SLOT.pack_into(self._map, offset, h, expira, contador)
+        return contador
+
+    def _set(self, key, value, expiry):
+        h = self._hash(key)
+        offset, _, _ = self._find(h, time.time(), True)
+        SLOT.pack_into(self._map, offset, h, time.time() + expiry, value)
+
+    def _get(self, key):
+        _, contador, expira = self._find(self._hash(key), time.time(), False)
+        return contador, expira
+
+    def _clear(self, key):
+        h = self._hash(key)
+        offset, _, expira = self._find(h, time.time(), False)
+        if offset is not None and expira:
+            SLOT.pack_into(self._map, offset, 0, 0.0, 0)
+
+    def incr(self, key, expiry, amount=1):
+        return self._locked(self._incr, key, expiry, amount)
+
+    def decr(self, key, amount=1):
+        return self._locked(self._incr, key, 0, -amount)
+
+    def get(self, key):
+        return self._locked(self._get, key)[0]
+
+    def set(self, key, value, expiry):
+        # Ao contrário de incr, sempre renova a expiração
+        self._locked(self._set, key, value, expiry)
+
+    def get_expiry(self, key):
+        expira = self._locked(self._get, key)[1]
+        return expira or time.time()
+
+    def clear(self, key):
+        self._locked(self._clear, key)
+
+    def check(self):
+        try:
+            self._locked(lambda: None)
+            return True
+        except OSError:
+            return False
+
+    def reset(self):
+        def _reset():
+            ocupados = sum(
+                1 for i in range(self.slots)
+                if SLOT.unpack_from(self._map, self._offset(i))[0]
+            )
+            self._map[HEADER.size:] = bytes(self.size - HEADER.size)
+            return ocupados
+
+        return self._locked(_reset)
+
+    def _acquire_token(self, key, rate, capacity, amount):
+        now = time.time()
+        h = self._hash(key)
+        offset, _, cheio_em = self._find(h, now, True)
+
+        # Balde guardado como o instante em que volta a ficar cheio: slot vencido = balde cheio
+        cheio_em = max(cheio_em, now)
+        disponiveis = capacity - (cheio_em - now) * rate
+        if disponiveis < amount:
+            return (amount - disponiveis) / rate
+
+        SLOT.pack_into(self._map, offset, h, cheio_em + amount / rate, 0)
+        return 0.0
+
+    def acquire_token(self, key, rate, capacity, amount=1):
+        """
+        Token bucket de ``capacity`` fichas repostas a ``rate`` por segundo.
+        Retorna 0 se a ficha foi consumida, ou quantos segundos esperar.
+        """
+        return self._locked(self._acquire_token, key, rate, capacity, amount)
+
+    def _sliding_window(self, key, expiry, now):
+        previous_key, current_key = self.sliding_window_keys(key, expiry, now)
+        previous_count, _ = self._get(previous_key)
+        current_count, _ = self._get(current_key)
+
+        previous_ttl = 0.0 if previous_count == 0 else (1 - (((now - expiry) / expiry) % 1)) * expiry
+        current_ttl = (1 - ((now / expiry) % 1)) * expiry + expiry
+        return current_key, previous_count, previous_ttl, current_count, current_ttl
+
+    def _acquire_sliding(self, key, limit, expiry, amount):
+        now = time.time()
+        current_key, previous_count, previous_ttl, current_count, _ = self._sliding_window(key, expiry, now)
+
+        # Leitura e incremento sob o mesmo lock: não há corrida entre workers a desfazer
+        if floor(previous_count * previous_ttl / expiry + current_count) + amount > limit:
+            return False
+
+        self._incr(current_key, 2 * expiry, amount)
+        return True
+
+    def acquire_sliding_window_entry(self, key, limit, expiry, amount=1):
+        if amount > limit:
+            return False
+        return self._locked(self._acquire_sliding, key, limit, expiry, amount)
+
+    def get_sliding_window(self, key, expiry):
+        return self._locked(lambda: self._sliding_window(key, expiry, time.time())[1:])
+
+    def clear_sliding_window(self, key, expiry):
+        def _clear_both():
+            for chave in self.sliding_window_keys(key, expiry, time.time()):
+                self._clear(chave)
+
+        self._locked(_clear_both)
+
+class ChangeMarks:
+    """
+    Instante (em nanossegundos) da última alteração de cada chave, compartilhado pelos processos
+    da máquina através de um arquivo mapeado em memória (``mmap:///caminho/arquivo?slots=65536``;
+    com ``memory://``, um mapa anônimo só do processo).
+
+    As chaves não são guardadas: cada uma cai num slot pelo hash e o slot fica com a alteração mais
+    recente de todas as chaves que caem nele. Uma colisão só faz outra chave parecer alterada, e
+    nenhuma marca é descartada para abrir espaço. Só as escritas travam o arquivo.
+    """
+
+    def __init__(self, uri):
+        parsed = urlparse(uri)
+        if parsed.scheme == "memory":
+            self.path = None
+        else:
+            if fcntl is None:
+                raise ConfigurationError("mmap:// requer fcntl (apenas sistemas POSIX); use memory://")
+            self.path = parsed.path
+            if not self.path:
+                raise ConfigurationError("Informe o caminho do arquivo: mmap:///caminho/arquivo")
+
+        self.slots = int(parse_qs(parsed.query).get("slots", [DEFAULT_SLOTS])[0])
+        self.size = HEADER.size + self.slots * MARK.size
+
+        self._lock = threading.Lock()
+        self._pid = None
+        self._fd = None
+        self._map = None
+
+    def _open(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            if self.path is None:
+                self._fd, self._map = None, mmap.mmap(-1, self.size)
+            else:
+                self._fd, self._map = _map_file(self.path, self.size, CHANGES_MAGIC, self.slots)
+            self._pid = os.getpid()
+
+    def _offset(self, key):
+        return HEADER.size + (_key_hash(key) % self.slots) * MARK.size
+
+    def mark(self, key):
+        if self._pid != os.getpid():
+            self._open()
+        offset = self._offset(key)
+
+        with self._lock:
+            if self._fd is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                # Nunca volta para trás, mesmo com o relógio de outro processo um pouco atrás
+                agora = max(time.time_ns(), MARK.unpack_from(self._map, offset)[0] + 1)
+                MARK.pack_into(self._map, offset, agora)
+                return agora
+            finally:
+                if self._fd is not None:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def changed_at(self, key):
+        """Instante da última alteração da chave (ou de uma que colide com ela); 0 se nunca mudou."""
+        if self._pid != os.getpid():
+            self._open()
+        offset = self._offset(key)
+
+        # Sem trava: o slot é um inteiro alinhado de 8 bytes gravado de uma vez. Ainda assim, só
+        # aceita o valor quando duas leituras seguidas concordam
+        valor = MARK.unpack_from(self._map, offset)[0]
+        while True:
+            novamente = MARK.unpack_from(self._map, offset)[0]
+            if novamente == valor:
+                return valor
+            valor = novamente
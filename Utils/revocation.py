@@ -0,0 +1,87 @@
+import logging
+import os
+import threading
+from datetime import datetime
+from dotenv import load_dotenv
+from werkzeug.exceptions import ServiceUnavailable
+from Repositories.tokenRepository import TokenRepository
+from Utils.background import every
+
+load_dotenv()
+
+repo = TokenRepository()
+
+REVOCATION_SYNC_INTERVAL = float(os.getenv("REVOCATION_SYNC_INTERVAL", 5))
+REVOCATION_PURGE_INTERVAL = 3600
+# Releitura de ids recentes: INSERTs concorrentes podem confirmar fora da ordem do AUTO_INCREMENT
+SYNC_OVERLAP = 100
+
+class RevocationList:
+    def __init__(self):
+        self._revogados = {}
+        self._ultimo_id = 0
+        self._pid = None
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+
+    def _ensure_synced(self):
+        # Cada processo do gunicorn carrega a lista uma vez e depois só busca o que é novo
+        if self._pid == os.getpid():
+            return
+
+        # As outras threads esperam a carga inicial terminar: com a lista ainda vazia, tokens
+        # revogados seriam aceitos
+        with self._load_lock:
+            if self._pid == os.getpid():
+                return
+            with self._lock:
+                self._revogados = {}
+                self._ultimo_id = 0
+            if not self.sync():
+                raise ServiceUnavailable("Não foi possível validar o token, tente novamente em instantes", retry_after=1)
+            self._pid = os.getpid()
+
+        every("revocation-sync", REVOCATION_SYNC_INTERVAL, self.sync)
+        every("revocation-purge", REVOCATION_PURGE_INTERVAL, self.purge)
+
+    def sync(self):
+        agora = datetime.utcnow()
+        rows = repo.list_since(max(0, self._ultimo_id - SYNC_OVERLAP), agora)
+        if rows is None:
+            return False
+
+        with self._lock:
+            for row in rows:
+                self._revogados[row["jti"]] = row["expira_em"]
+                self._ultimo_id = max(self._ultimo_id, row["id"])
+
+            # Varredura: tokens expirados já são recusados pelo próprio JWT
+            for chave in [chave for chave, expira in self._revogados.items() if expira <= agora]:
+                del self._revogados[chave]
+        return True
+
+    def purge(self):
+        repo.purge_expired(datetime.utcnow())
+
+    def is_revoked(self, jti, usuario_id):
+        self._ensure_synced()
+        # Sem I/O: duas consultas a um dict em memória
+        return jti in self._revogados or f"usuario:{usuario_id}" in self._revogados
+
+    def revoke(self, jti, expira_em):
+        self._ensure_synced()
+        if not repo.revoke(jti, expira_em):
+            return False
+
+        with self._lock:
+            self._revogados[jti] = expira_em
+        return True
+
+    def revoke_user(self, usuario_id, expira_em):
+        # Invalida todos os tokens do usuário emitidos até expira_em (ex.: conta excluída)
+        return self.revoke(f"usuario:{usuario_id}", expira_em)
+
+    def __len__(self):
+        return len(self._revogados)
+
+revocation_list = RevocationList()
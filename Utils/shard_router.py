@@ -0,0 +1,125 @@
+import os
+import random
+from dotenv import load_dotenv
+from werkzeug.exceptions import ServiceUnavailable
+from Repositories.directoryRepository import DirectoryRepository
+from Utils.cache import TTLCache
+from Utils.storage import SHARDED, SHARD_ID_STRIDE, shard_pools
+
+load_dotenv()
+
+# Quanto tempo um worker confia no shard de um usuário sem reler o diretório (só leituras)
+SHARD_DIRECTORY_TTL = float(os.getenv("SHARD_DIRECTORY_TTL", 30))
+# Shards que recebem novos cadastros (ex.: tire um shard cheio da lista)
+SHARD_NEW_USERS = [
+    int(shard) for shard in os.getenv("SHARD_NEW_USERS", "").split(",") if shard.strip()
+] or list(range(len(shard_pools)))
+SHARD_MOVE_RETRY_AFTER = 5
+
+class UserMovingError(ServiceUnavailable):
+    def __init__(self):
+        super().__init__(
+            "Conta em migração entre bancos, tente novamente em instantes",
+            retry_after=SHARD_MOVE_RETRY_AFTER
+        )
+
+class ShardRouter:
+    """
+    Decide em qual shard estão os dados de um usuário.
+
+    Leituras usam um cache local do diretório (SHARD_DIRECTORY_TTL); escritas sempre releem a linha
+    do diretório com trava compartilhada e falham com UserMovingError enquanto o usuário é migrado.
+    Usuários sem linha no diretório (anteriores ao sharding) ficam no shard 0.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory or DirectoryRepository()
+        self._shards = TTLCache(maxsize=10000, ttl=SHARD_DIRECTORY_TTL)
+
+    @property
+    def sharded(self):
+        return SHARDED
+
+    @property
+    def shards(self):
+        return range(len(shard_pools))
+
+    def shard_for_user(self, usuario_id):
+        if not SHARDED:
+            return 0
+
+        shard = self._shards.get(usuario_id)
+        if shard is None:
+            row = self.directory.get(usuario_id)
+            shard = row["shard"] if row else 0
+            self._shards.set(usuario_id, shard)
+        return shard
+
+    def shard_for_write(self, usuario_id):
+        if not SHARDED:
+            return 0
+
+        row = self.directory.get_for_write(usuario_id)
+        if row and row["movendo"]:
+            raise UserMovingError()
+
+        shard = row["shard"] if row else 0
+        self._shards.set(usuario_id, shard)
+        return shard
+
+    def shards_for_write(self, usuario_ids):
+        """{usuario_id: shard} para gravações em lote; usuários em migração ficam de fora."""
+        usuario_ids = set(usuario_ids)
+        if not SHARDED:
+            return dict.fromkeys(usuario_ids, 0)
+
+        rows = {row["id"]: row for row in self.directory.get_many_for_write(usuario_ids)}
+        return {
+            usuario_id: rows[usuario_id]["shard"] if usuario_id in rows else 0
+            for usuario_id in usuario_ids
+            if not (usuario_id in rows and rows[usuario_id]["movendo"])
+        }
+
+    def locate(self, campo, valor):
+        """Shard do dono de um username/e-mail, ou None se ninguém usa o valor."""
+        if not SHARDED:
+            return 0
+
+        row = self.directory.find(campo, valor)
+        if row is None:
+            return None
+        self._shards.set(row["id"], row["shard"])
+        return row["shard"]
+
+    def link_shard_candidates(self, link_id):
+        # O resto do id indica o shard onde o link nasceu; links de usuários migrados (ou anteriores
+        # ao sharding) estão em outro
+        if not SHARDED:
+            return [0]
+        origem = (link_id - 1) % SHARD_ID_STRIDE
+        if origem not in self.shards:
+            return list(self.shards)
+        return [origem] + [shard for shard in self.shards if shard != origem]
+
+    def allocate(self, username, email):
+        """
+        Reserva username e e-mail no diretório e escolhe o shard de um novo usuário.
+
+        Devolve (usuario_id, shard); fora do modo com shards o id vem do próprio INSERT em usuarios.
+        """
+        if not SHARDED:
+            return None, 0
+
+        shard = random.choice(SHARD_NEW_USERS)
+        return self.directory.insert(username, email, shard), shard
+
+    def rename(self, usuario_id, campo, valor):
+        if SHARDED:
+            self.directory.update(usuario_id, campo, valor)
+
+    def remove(self, usuario_id):
+        if SHARDED:
+            self.directory.delete(usuario_id)
+            self._shards.delete(usuario_id)
+
+router = ShardRouter()
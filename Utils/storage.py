@@ -0,0 +1,27 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Backend dos repositórios: mysql (CONN_URL, com réplica e shards opcionais) ou sqlite (arquivo
+# local em SQLITE_PATH, para benchmarks e CI sem servidor e implantações de um único nó).
+# Os dois expõem a mesma interface; só o backend escolhido é importado.
+DB_BACKEND = os.getenv("DB_BACKEND", "mysql").lower()
+SQLITE = DB_BACKEND == "sqlite"
+
+if SQLITE:
+    from sqlite3 import Error, IntegrityError
+    from Utils.db_sqlite import (
+        SHARDED, SHARD_ID_STRIDE, connection_pool, replica_pool, shard_pools,
+        get_db_cursor, get_read_cursor, replica_read, on_commit, mark_written, set_rollback_only,
+        checkpoint, init_unit_of_work, duplicate_key
+    )
+elif DB_BACKEND == "mysql":
+    from mysql.connector import Error, IntegrityError
+    from Utils.db_railway import (
+        SHARDED, SHARD_ID_STRIDE, connection_pool, replica_pool, shard_pools,
+        get_db_cursor, get_read_cursor, replica_read, on_commit, mark_written, set_rollback_only,
+        checkpoint, init_unit_of_work, duplicate_key
+    )
+else:
+    raise ValueError(f"DB_BACKEND inválido: {DB_BACKEND} (use mysql ou sqlite)")
@@ -0,0 +1,99 @@
+import atexit
+import os
+from datetime import datetime, timedelta, timezone
+from dotenv import load_dotenv
+from Repositories.clickRepository import ClickRepository
+from Repositories.linkRepository import LinkRepository
+from Utils.background import every
+from Utils.counter_buffer import CounterBuffer
+
+load_dotenv()
+
+repo = ClickRepository()
+link_repo = LinkRepository()
+
+CLICK_FLUSH_INTERVAL = float(os.getenv("CLICK_FLUSH_INTERVAL", 10))
+CLICK_COMPACT_INTERVAL = float(os.getenv("CLICK_COMPACT_INTERVAL", 3600))
+HOURLY_RETENTION_DAYS = int(os.getenv("HOURLY_RETENTION_DAYS", 7))
+STATS_MAX_DAYS = 366
+
+clicks = CounterBuffer()
+
+def flush_clicks():
+    contagens = clicks.drain()
+    if not contagens:
+        return
+
+    pendentes = repo.increment_many(contagens)
+    if pendentes:
+        clicks.restore(pendentes)
+
+def compact_clicks():
+    hoje = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    repo.compact(hoje - timedelta(days=HOURLY_RETENTION_DAYS))
+
+atexit.register(flush_clicks)
+
+def _parse_datetime(valor):
+    data = datetime.fromisoformat(valor)
+    if data.tzinfo is not None:
+        data = data.astimezone(timezone.utc).replace(tzinfo=None)
+    return data
+
+class ClickWorker:
+    def register_click(self, link_id):
+        link = link_repo.find_public(link_id)
+        if link is False:
+            return {"error": "Erro ao buscar link"}, 500
+        if not link:
+            return {"error": "Link não encontrado"}, 404
+
+        hora = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+        clicks.add((link_id, link["usuario_id"], hora))
+        every("click-flush", CLICK_FLUSH_INTERVAL, flush_clicks)
+        every("click-compact", CLICK_COMPACT_INTERVAL, compact_clicks)
+
+        url = link["url"].strip()
+        if not url.lower().startswith(("http://", "https://")):
+            url = f"https://{url}"
+        return {"url": url}
+
+    def stats(self, usuario_id, inicio=None, fim=None, granularidade="day", link_id=None):
+        if granularidade not in ("hour", "day"):
+            return {"error": "granularity deve ser hour ou day"}, 400
+
+        passo = timedelta(hours=1) if granularidade == "hour" else timedelta(days=1)
+        truncar = {"minute": 0, "second": 0, "microsecond": 0}
+        if granularidade == "day":
+            truncar["hour"] = 0
+
+        try:
+            fim = _parse_datetime(fim) if fim else datetime.utcnow()
+            inicio = _parse_datetime(inicio) if inicio else fim - passo * (23 if granularidade == "hour" else 6)
+        except ValueError:
+            return {"error": "Datas devem estar no formato ISO 8601"}, 400
+
+        # Intervalo [from, to] inclusivo na granularidade pedida
+        inicio = inicio.replace(**truncar)
+        fim = fim.replace(**truncar) + passo
+
+        if inicio >= fim:
+            return {"error": "from deve ser anterior a to"}, 400
+        if fim - inicio > timedelta(days=STATS_MAX_DAYS):
+            return {"error": f"Intervalo máximo de {STATS_MAX_DAYS} dias"}, 400
+
+        if link_id is not None and not link_repo.find_by_id(link_id, usuario_id):
+            return {"error": "Link não encontrado"}, 404
+
+        rows = repo.get_series(usuario_id, inicio, fim, granularidade, link_id)
+        if rows is None:
+            return {"error": "Erro ao buscar estatísticas"}, 500
+
+        series = [{"periodo": row["periodo"].isoformat(), "cliques": int(row["cliques"])} for row in rows]
+        return {
+            "granularity": granularidade,
+            "from": inicio.isoformat(),
+            "to": (fim - passo).isoformat(),
+            "total": sum(ponto["cliques"] for ponto in series),
+            "series": series
+        }
@@ -1,27 +1,133 @@
 from Repositories.linkRepository import LinkRepository
+from Repositories.userRepository import UserRepository
 from Utils.valid_url import is_valid_url, get_url_error
+from Utils.background import run_in_background
+import base64
+import csv
+import io
+import json
+import threading
 
 repo = LinkRepository()
+user_repo = UserRepository()
+
+BATCH_MAX_OPERATIONS = 500
+PAGE_DEFAULT_LIMIT = 50
+PAGE_MAX_LIMIT = 200
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+IMPORT_BATCH_SIZE = 500
+IMPORT_MAX_LINKS = 10000
+IMPORT_MAX_ERRORS = 50
+# Tamanho das colunas titulo VARCHAR(100) e url VARCHAR(150)
+TITULO_MAX_LENGTH = 100
+URL_MAX_LENGTH = 150
+
+_renormalizacoes_pendentes = set()
+_renormalizacoes_lock = threading.Lock()
+
+def _renormalize(usuario_id):
+    try:
+        repo.renormalize(usuario_id)
+    finally:
+        with _renormalizacoes_lock:
+            _renormalizacoes_pendentes.discard(usuario_id)
+
+def _encode_cursor(link):
+    # Links antigos sem posição (ordem NULL) viram ":<id>"
+    ordem = "" if link.ordem is None else link.ordem
+    return base64.urlsafe_b64encode(f"{ordem}:{link.id}".encode()).decode().rstrip("=")
+
+def _decode_cursor(cursor):
+    try:
+        texto = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        ordem, link_id = texto.split(":")
+        return (int(ordem) if ordem else None), int(link_id)
+    except ValueError:
+        return None
+
+def _to_ndjson(rows):
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + "\n"
+
+def _to_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=["titulo", "url", "ordem"])
+    writer.writeheader()
+
+    for row in rows:
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+    if buffer.getvalue():
+        yield buffer.getvalue()
+
+def _read_ndjson(linhas):
+    for numero, linha in enumerate(linhas, start=1):
+        if not linha.strip():
+            continue
+        try:
+            registro = json.loads(linha)
+        except ValueError:
+            yield numero, "JSON inválido"
+            continue
+        yield numero, registro if isinstance(registro, dict) else "Linha deve ser um objeto JSON"
+
+def _read_csv(linhas):
+    reader = csv.DictReader(linhas)
+    for registro in reader:
+        yield reader.line_num, registro
+
+def _schedule_renormalize(usuario_id):
+    with _renormalizacoes_lock:
+        if usuario_id in _renormalizacoes_pendentes:
+            return
+        _renormalizacoes_pendentes.add(usuario_id)
+    run_in_background(_renormalize, usuario_id)
 
 class LinkWorker:
     def getAll(self, usuario_id):
-        links = repo.getAll(usuario_id)
-        if links is None:
+        resultado = repo.getAll(usuario_id)
+        if resultado is None:
             return {"error": "Erro ao buscar links"}, 500
-        
-        return [link.to_dict() for link in links]
+
+        links, versao = resultado
+        return {"links": [link.to_dict() for link in links], "versao": versao}
+
+    def get_page(self, usuario_id, limit=None, cursor=None):
+        if limit is None:
+            limit = PAGE_DEFAULT_LIMIT
+        if not isinstance(limit, int) or not 1 <= limit <= PAGE_MAX_LIMIT:
+            return {"error": f"limit deve estar entre 1 e {PAGE_MAX_LIMIT}"}, 400
+
+        after = None
+        if cursor:
+            after = _decode_cursor(cursor)
+            if after is None:
+                return {"error": "Cursor inválido"}, 400
+
+        resultado = repo.get_page(usuario_id, limit + 1, after)
+        if resultado is None:
+            return {"error": "Erro ao buscar links"}, 500
+
+        links, versao = resultado
+        pagina = links[:limit]
+        return {
+            "links": [link.to_dict() for link in pagina],
+            "next_cursor": _encode_cursor(pagina[-1]) if len(links) > limit else None,
+            "versao": versao
+        }
+
+    def get_version(self, usuario_id):
+        return user_repo.get_version(usuario_id)
     
     def create(self, usuario_id, titulo, url):
-        links = repo.getAll(usuario_id)
-        if links is None:
-            return {"error": "Erro ao buscar links existentes"}, 500
-        
         url_valida = is_valid_url(url)
         if not url_valida:
             return {"error": get_url_error(url)}, 400
 
-        nova_ordem = len(links) + 1
-        link = repo.create(usuario_id, titulo, url, nova_ordem)
+        link = repo.create(usuario_id, titulo, url)
         
         if not link:
             return {"error": "Erro ao adicionar link"}, 500
@@ -52,12 +158,182 @@ class LinkWorker:
         for link in links:
             if not isinstance(link, dict) or "id" not in link or "ordem" not in link:
                 return {"error": "Formato de link inválido"}, 400
+            if not isinstance(link["id"], int) or not isinstance(link["ordem"], int):
+                return {"error": "Formato de link inválido"}, 400
+
+        if len({link["id"] for link in links}) != len(links):
+            return {"error": "Links duplicados na lista"}, 400
         
-        sucesso = repo.reorder(usuario_id, links)
+        alterados = repo.reorder(usuario_id, links)
         
-        if not sucesso:
+        if alterados is None:
+            return {"error": "Um ou mais links não pertencem ao usuário"}, 404
+        if alterados is False:
             return {"error": "Erro ao reordenar links"}, 500
-        return {"message": "Links reordenados com sucesso"}
+        return {
+            "message": "Links reordenados com sucesso",
+            "alterados": alterados
+        }
+
+    def batch(self, usuario_id, operacoes):
+        if not operacoes or not isinstance(operacoes, list):
+            return {"error": "Lista de operações inválida"}, 400
+        if len(operacoes) > BATCH_MAX_OPERATIONS:
+            return {"error": f"Máximo de {BATCH_MAX_OPERATIONS} operações por lote"}, 400
+
+        creates, updates, deletes = [], [], []
+        ids_usados = set()
+        erros = []
+
+        for indice, operacao in enumerate(operacoes):
+            erro = self._validate_operation(operacao, ids_usados)
+            if erro:
+                erros.append({"indice": indice, "error": erro})
+                continue
+
+            op = operacao["op"]
+            if op == "create":
+                creates.append({"titulo": operacao["titulo"], "url": operacao["url"]})
+            elif op == "update":
+                updates.append({"id": operacao["id"], "titulo": operacao["titulo"], "url": operacao["url"]})
+            else:
+                deletes.append(operacao["id"])
+
+        if erros:
+            return {"error": "Operações inválidas, nada foi aplicado", "erros": erros}, 400
+
+        existentes = repo.apply_batch(usuario_id, creates, updates, deletes)
+        if existentes is False:
+            return {"error": "Erro ao aplicar operações"}, 500
+
+        resultados = []
+        for indice, operacao in enumerate(operacoes):
+            resultado = {"indice": indice, "op": operacao["op"]}
+            if operacao["op"] != "create":
+                resultado["id"] = operacao["id"]
+
+            if operacao["op"] == "create" or operacao["id"] in existentes:
+                resultado["sucesso"] = True
+            else:
+                resultado["sucesso"] = False
+                resultado["error"] = "Link não encontrado"
+            resultados.append(resultado)
+
+        return {
+            "message": "Operações aplicadas",
+            "resultados": resultados
+        }
+
+    def _validate_operation(self, operacao, ids_usados):
+        if not isinstance(operacao, dict) or operacao.get("op") not in ("create", "update", "delete"):
+            return "Operação inválida"
+
+        if operacao["op"] != "create":
+            link_id = operacao.get("id")
+            if not isinstance(link_id, int):
+                return "ID inválido"
+            if link_id in ids_usados:
+                return "Link repetido no lote"
+            ids_usados.add(link_id)
+
+        if operacao["op"] != "delete":
+            if not all([operacao.get("titulo"), operacao.get("url")]):
+                return "Campos obrigatórios"
+            if not isinstance(operacao["titulo"], str) or not isinstance(operacao["url"], str):
+                return "titulo e url devem ser texto"
+            if not is_valid_url(operacao["url"]):
+                return get_url_error(operacao["url"])
+
+        return None
+
+    def export(self, usuario_id, formato):
+        if formato not in EXPORT_FORMATS:
+            return {"error": "Formato inválido. Use ndjson ou csv"}, 400
+
+        rows = repo.iter_all(usuario_id)
+        return {
+            "mimetype": EXPORT_FORMATS[formato],
+            "arquivo": f"links.{formato}",
+            "linhas": _to_ndjson(rows) if formato == "ndjson" else _to_csv(rows)
+        }
+
+    def import_links(self, usuario_id, formato, linhas):
+        if formato not in EXPORT_FORMATS:
+            return {"error": "Formato inválido. Use ndjson ou csv"}, 400
+
+        registros = _read_ndjson(linhas) if formato == "ndjson" else _read_csv(linhas)
+        lote, erros = [], []
+        importados = ignorados = 0
+
+        try:
+            for numero, registro in registros:
+                erro = registro if isinstance(registro, str) else None
+                if erro is None and not all([registro.get("titulo"), registro.get("url")]):
+                    erro = "Campos obrigatórios"
+                if erro is None and not (isinstance(registro["titulo"], str) and isinstance(registro["url"], str)):
+                    erro = "titulo e url devem ser texto"
+                # Uma linha grande demais derrubaria o lote inteiro no INSERT
+                if erro is None and len(registro["titulo"]) > TITULO_MAX_LENGTH:
+                    erro = f"titulo deve ter no máximo {TITULO_MAX_LENGTH} caracteres"
+                if erro is None and len(registro["url"]) > URL_MAX_LENGTH:
+                    erro = f"url deve ter no máximo {URL_MAX_LENGTH} caracteres"
+                if erro is None and not is_valid_url(registro["url"]):
+                    erro = get_url_error(registro["url"])
+
+                if erro:
+                    ignorados += 1
+                    if len(erros) < IMPORT_MAX_ERRORS:
+                        erros.append({"linha": numero, "error": erro})
+                    continue
+
+                if importados + len(lote) >= IMPORT_MAX_LINKS:
+                    erros.append({"linha": numero, "error": f"Limite de {IMPORT_MAX_LINKS} links por importação"})
+                    break
+
+                lote.append({"titulo": registro["titulo"], "url": registro["url"]})
+                if len(lote) == IMPORT_BATCH_SIZE:
+                    if repo.create_many(usuario_id, lote) is False:
+                        return {"error": "Erro ao importar links", "importados": importados}, 500
+                    importados += len(lote)
+                    lote = []
+
+        except (UnicodeDecodeError, csv.Error):
+            return {"error": "Arquivo inválido. Use UTF-8", "importados": importados}, 400
+
+        if lote:
+            if repo.create_many(usuario_id, lote) is False:
+                return {"error": "Erro ao importar links", "importados": importados}, 500
+            importados += len(lote)
+
+        return {
+            "message": "Importação concluída",
+            "importados": importados,
+            "ignorados": ignorados,
+            "erros": erros
+        }
+
+    def move(self, usuario_id, id, before, after):
+        if before is None and after is None:
+            return {"error": "Informe before ou after"}, 400
+
+        for vizinho in (before, after):
+            if vizinho is not None and (not isinstance(vizinho, int) or vizinho == id):
+                return {"error": "Vizinho inválido"}, 400
+
+        resultado = repo.move(usuario_id, id, before_id=before, after_id=after)
+
+        if resultado is None:
+            return {"error": "Link ou vizinhos inválidos"}, 400
+        if resultado is False:
+            return {"error": "Erro ao mover link"}, 500
+
+        if resultado["denso"]:
+            _schedule_renormalize(usuario_id)
+
+        return {
+            "message": "Link movido com sucesso",
+            "ordem": resultado["ordem"]
+        }
 
     def get_by_id(self, link_id, usuario_id):
         link = repo.find_by_id(link_id, usuario_id)
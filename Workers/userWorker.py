@@ -1,9 +1,11 @@
-import bcrypt
-import jwt
-import os
 from dotenv import load_dotenv
-from datetime import datetime, timedelta
-from Repositories.userRepository import UserRepository
+from datetime import datetime
+from Repositories.userRepository import UserRepository, DuplicateUserError
+from Utils.auth import create_tokens, REFRESH_TOKEN_TTL
+from Utils.background import run_in_background
+from Utils.storage import checkpoint
+from Utils.revocation import revocation_list
+from Utils.password_hasher import hash_password, check_password, needs_rehash
 from Utils.valid_email import is_valid_email
 from Utils.valid_username import is_valid_username, get_username_error
 from Utils.valid_password import verificar_senha
@@ -11,7 +13,19 @@ from Utils.valid_password import verificar_senha
 load_dotenv()
 
 repo = UserRepository()
-SECRET_KEY = os.getenv('SECRET_KEY')
+
+def _check_password(senha, senha_hash):
+    # O bcrypt leva centenas de ms: a conexão da requisição volta ao pool enquanto isso
+    checkpoint()
+    return check_password(senha, senha_hash)
+
+def _hash_password(senha):
+    checkpoint()
+    return hash_password(senha)
+
+def _rehash(usuario_id, senha, old_hash):
+    # Condicionado ao hash antigo: não sobrescreve uma troca de senha concorrente
+    repo.update_password(usuario_id, hash_password(senha), senha_atual=old_hash)
 
 class UserWorker:
     def register(self, username, email, senha):
@@ -24,13 +38,20 @@ class UserWorker:
         if not valido:
             return {"error": msg}, 400
         
-        if repo.find_by_username(username):
+        disponivel = repo.check_availability(username, email)
+        if disponivel is None:
+            return {"error": "Erro ao criar usuário"}, 500
+        if not disponivel["username"]:
             return {"error": "Username já existente"}, 400
-        if repo.find_by_email(email):
+        if not disponivel["email"]:
             return {"error": "E-Mail já existente"}, 400
         
-        hashed = bcrypt.hashpw(senha.encode("utf-8"), bcrypt.gensalt())
-        user = repo.create(username, email, hashed.decode("utf-8"))
+        try:
+            user = repo.create(username, email, _hash_password(senha))
+        except DuplicateUserError as e:
+            if e.campo == "email":
+                return {"error": "E-Mail já existente"}, 400
+            return {"error": "Username já existente"}, 400
         
         if not user:
             return {"error": "Erro ao criar usuário"}, 500
@@ -38,28 +59,14 @@ class UserWorker:
     
     def login(self, email, senha):
         user = repo.find_by_email(email)
-        if not user or not bcrypt.checkpw(senha.encode("utf-8"), user.senha.encode("utf-8")):
+        if not user or not _check_password(senha, user.senha):
             return {"error": "Credenciais inválidas"}, 401
+
+        # Custo do bcrypt mudou (BCRYPT_ROUNDS): regrava o hash sem atrasar o login
+        if needs_rehash(user.senha):
+            run_in_background(_rehash, user.id, senha, user.senha)
         
-        access_token = jwt.encode(
-            {
-                "id": user.id,
-                "exp": datetime.utcnow() + timedelta(minutes=15),
-                "type": "access"
-            },
-            SECRET_KEY,
-            algorithm="HS256"
-        )
-
-        refresh_token = jwt.encode(
-            {
-                "id": user.id,
-                "exp": datetime.utcnow() + timedelta(days=7),
-                "type": "refresh"
-            },
-            SECRET_KEY,
-            algorithm="HS256"
-        )
+        access_token, refresh_token = create_tokens(user.id)
         
         return {
             "access_token": access_token,
@@ -73,6 +80,9 @@ class UserWorker:
             return {"error": "Usuário não encontrado"}, 404
         return user
 
+    def get_profile_version(self, username):
+        return repo.get_version_by_username(username)
+
     def update_foto_perfil(self, usuario_id, image_url):
         sucesso = repo.update_foto(usuario_id, image_url)
         if not sucesso:
@@ -83,23 +93,26 @@ class UserWorker:
         }
 
     def update_username(self, usuario_id, new_username, password):
+        if len(new_username) < 3 or len(new_username) > 20:
+            return {"error": "Username deve ter entre 3 e 20 caracteres"}, 400
+
         user = repo.find_by_id(usuario_id)
         if not user:
             return {"error": "Usuário não encontrado"}, 404
 
-        if not bcrypt.checkpw(password.encode("utf-8"), user.senha.encode("utf-8")):
+        if not _check_password(password, user.senha):
             return {"error": "Senha incorreta"}, 403
 
-        if len(new_username) < 3 or len(new_username) > 20:
-            return {"error": "Username deve ter entre 3 e 20 caracteres"}, 400
+        if new_username != user.username:
+            try:
+                sucesso = repo.update_username(usuario_id, new_username, senha_atual=user.senha)
+            except DuplicateUserError:
+                return {"error": "Username já está em uso"}, 400
 
-        existing_user = repo.find_by_username(new_username)
-        if existing_user and existing_user.id != usuario_id:
-            return {"error": "Username já está em uso"}, 400
-
-        sucesso = repo.update_username(usuario_id, new_username)
-        if not sucesso:
-            return {"error": "Erro ao atualizar username"}, 500
+            if sucesso is None:
+                return {"error": "Senha incorreta"}, 403
+            if not sucesso:
+                return {"error": "Erro ao atualizar username"}, 500
         return {
             "message": "Username atualizado com sucesso",
             "username": new_username
@@ -110,35 +123,39 @@ class UserWorker:
         if not user:
             return {"error": "Usuário não encontrado"}, 404
 
-        if not bcrypt.checkpw(password.encode("utf-8"), user.senha.encode("utf-8")):
+        if not _check_password(password, user.senha):
             return {"error": "Senha incorreta"}, 403
 
-        existing_user = repo.find_by_email(new_email)
-        if existing_user and existing_user.id != usuario_id:
-            return {"error": "E-mail já está em uso"}, 400
+        if new_email != user.email:
+            try:
+                sucesso = repo.update_email(usuario_id, new_email, senha_atual=user.senha)
+            except DuplicateUserError:
+                return {"error": "E-mail já está em uso"}, 400
 
-        sucesso = repo.update_email(usuario_id, new_email)
-        if not sucesso:
-            return {"error": "Erro ao atualizar e-mail"}, 500
+            if sucesso is None:
+                return {"error": "Senha incorreta"}, 403
+            if not sucesso:
+                return {"error": "Erro ao atualizar e-mail"}, 500
         return {
             "message": "E-mail atualizado com sucesso",
             "email": new_email
         }
 
     def update_password(self, usuario_id, current_password, new_password):
+        if len(new_password) < 6:
+            return {"error": "Nova senha deve ter no mínimo 6 caracteres"}, 400
+
         user = repo.find_by_id(usuario_id)
         if not user:
             return {"error": "Usuário não encontrado"}, 404
 
-        if not bcrypt.checkpw(current_password.encode("utf-8"), user.senha.encode("utf-8")):
+        if not _check_password(current_password, user.senha):
             return {"error": "Senha atual incorreta"}, 403
 
-        if len(new_password) < 6:
-            return {"error": "Nova senha deve ter no mínimo 6 caracteres"}, 400
-
-        new_password_hash = bcrypt.hashpw(new_password.encode("utf-8"), bcrypt.gensalt())
-        sucesso = repo.update_password(usuario_id, new_password_hash.decode("utf-8"))
+        sucesso = repo.update_password(usuario_id, _hash_password(new_password), senha_atual=user.senha)
         
+        if sucesso is None:
+            return {"error": "Senha atual incorreta"}, 403
         if not sucesso:
             return {"error": "Erro ao atualizar senha"}, 500
         return {"message": "Senha atualizada com sucesso"}
@@ -148,10 +165,13 @@ class UserWorker:
         if not user:
             return {"error": "Usuário não encontrado"}, 404
 
-        if not bcrypt.checkpw(password.encode("utf-8"), user.senha.encode("utf-8")):
+        if not _check_password(password, user.senha):
             return {"error": "Senha incorreta"}, 403
 
         sucesso = repo.delete_user(usuario_id)
         if not sucesso:
             return {"error": "Erro ao excluir conta"}, 500
+
+        # Nenhum token emitido para a conta pode continuar valendo (refresh dura REFRESH_TOKEN_TTL)
+        revocation_list.revoke_user(usuario_id, datetime.utcnow() + REFRESH_TOKEN_TTL)
         return {"message": "Conta excluída com sucesso"}
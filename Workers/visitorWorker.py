@@ -0,0 +1,103 @@
+import atexit
+import logging
+import os
+import threading
+from datetime import date, datetime, timedelta
+from dotenv import load_dotenv
+from Repositories.visitorRepository import VisitorRepository
+from Utils.background import every
+from Utils.hyperloglog import HyperLogLog
+
+load_dotenv()
+
+repo = VisitorRepository()
+
+VISITOR_FLUSH_INTERVAL = float(os.getenv("VISITOR_FLUSH_INTERVAL", 60))
+VISITOR_MAX_SKETCHES = int(os.getenv("VISITOR_MAX_SKETCHES", 5000))
+VISITOR_FLUSH_BATCH = 200
+VISITORS_MAX_DAYS = 366
+
+_sketches = {}
+_lock = threading.Lock()
+
+def _merge_pending(pendentes):
+    with _lock:
+        for chave, sketch in pendentes.items():
+            atual = _sketches.get(chave)
+            if atual is None:
+                _sketches[chave] = sketch
+            else:
+                atual.merge(sketch)
+
+def flush_visitors():
+    global _sketches
+
+    with _lock:
+        pendentes, _sketches = _sketches, {}
+
+    chaves = list(pendentes)
+    for i in range(0, len(chaves), VISITOR_FLUSH_BATCH):
+        lote = {chave: pendentes[chave] for chave in chaves[i:i + VISITOR_FLUSH_BATCH]}
+        # A união é idempotente: devolver o lote à memória não conta visitantes duas vezes
+        pendentes = repo.merge_many(lote)
+        if pendentes:
+            _merge_pending(pendentes)
+
+atexit.register(flush_visitors)
+
+class VisitorWorker:
+    def record(self, usuario_id, visitante):
+        chave = (usuario_id, datetime.utcnow().date())
+
+        with _lock:
+            sketch = _sketches.get(chave)
+            if sketch is None:
+                if len(_sketches) >= VISITOR_MAX_SKETCHES:
+                    logging.error("Limite de sketches de visitantes em memória atingido; visita descartada")
+                    return
+                sketch = _sketches[chave] = HyperLogLog()
+            sketch.add(visitante)
+
+        every("visitor-flush", VISITOR_FLUSH_INTERVAL, flush_visitors)
+
+    def visitors(self, usuario_id, inicio=None, fim=None):
+        try:
+            fim = date.fromisoformat(fim) if fim else datetime.utcnow().date()
+            inicio = date.fromisoformat(inicio) if inicio else fim - timedelta(days=6)
+        except ValueError:
+            return {"error": "Datas devem estar no formato AAAA-MM-DD"}, 400
+
+        # Intervalo [from, to] inclusivo em dias
+        fim = fim + timedelta(days=1)
+
+        if inicio >= fim:
+            return {"error": "from deve ser anterior a to"}, 400
+        if (fim - inicio).days > VISITORS_MAX_DAYS:
+            return {"error": f"Intervalo máximo de {VISITORS_MAX_DAYS} dias"}, 400
+
+        rows = repo.get_range(usuario_id, inicio, fim)
+        if rows is None:
+            return {"error": "Erro ao buscar visitantes"}, 500
+
+        dias = {row["dia"]: HyperLogLog.from_bytes(row["sketch"]) for row in rows}
+
+        # Visitas deste processo que ainda não foram gravadas
+        with _lock:
+            locais = [(dia, sketch.to_bytes()) for (dono, dia), sketch in _sketches.items()
+                      if dono == usuario_id and inicio <= dia < fim]
+        for dia, registradores in locais:
+            local = HyperLogLog.from_bytes(registradores)
+            dias[dia] = dias[dia].merge(local) if dia in dias else local
+
+        total = HyperLogLog()
+        series = []
+        for dia in sorted(dias):
+            total.merge(dias[dia])
+            series.append({"dia": dia.isoformat(), "visitantes": dias[dia].count()})
+
+        return {
+            "from": inicio.isoformat(),
+            "to": (fim - timedelta(days=1)).isoformat(),
+            "unicos": total.count(),
+            "series": series
+        }
@@ -6,6 +6,8 @@ from extensions import limiter
 from Controllers.userController import user_bp
 from Controllers.linkController import link_bp
 from Controllers.googleAuthController import google_auth_bp
+from Utils import http_client
+from Utils.storage import SHARDED, connection_pool, replica_pool, shard_pools, init_unit_of_work
 import logging
 
 app = Flask(__name__)
@@ -15,8 +17,9 @@ CORS(app, resources={
             "https://mylinks-352x.onrender.com",
             "http://localhost:8080"
         ],
-        "methods": ["GET", "POST", "PUT", "DELETE"],
-        "allow_headers": ["Content-Type", "Authorization"]
+        "methods": ["GET", "POST", "PUT", "PATCH", "DELETE"],
+        "allow_headers": ["Content-Type", "Authorization", "If-None-Match"],
+        "expose_headers": ["ETag"]
     }
 })
 
@@ -51,6 +54,8 @@ swaggerui_bp = get_swaggerui_blueprint(
 )
 
 limiter.init_app(app)
+# Registrado por último: o commit roda antes dos demais after_request (cabeçalhos de segurança)
+init_unit_of_work(app)
 
 logging.basicConfig(
     level=logging.ERROR,
@@ -73,6 +78,13 @@ def ratelimit_handler(e):
         "message": str(e.description)
     }), 429
 
+@app.errorhandler(503)
+def service_unavailable_handler(e):
+    response = jsonify({"error": e.description})
+    if getattr(e, "retry_after", None) is not None:
+        response.headers["Retry-After"] = str(e.retry_after)
+    return response, 503
+
 @app.route("/openapi.yaml")
 def get_openapi_spec():
     return send_file('openapi.yaml')
@@ -84,6 +96,15 @@ def health_check():
         "service": "mylinks-api"
     }), 200
 
+@app.route("/health/stats", methods=["GET"])
+def health_stats():
+    return jsonify({
+        "db": connection_pool.stats(),
+        "db_replica": replica_pool.stats() if replica_pool is not None else None,
+        "db_shards": [pool.stats() for pool in shard_pools] if SHARDED else None,
+        "http": http_client.stats()
+    }), 200
+
 @app.route("/", methods=["GET"])
 def root():
     return jsonify({
@@ -0,0 +1,51 @@
+import argparse
+import statistics
+import time
+from Repositories.userRepository import UserRepository
+from Utils.storage import get_db_cursor
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+def with_cursor(query):
+    def fn(username):
+        with get_db_cursor() as cursor:
+            return query(cursor, username)
+    return fn
+
+def run(label, fn, username, iterations, warmup):
+    for _ in range(warmup):
+        fn(username)
+
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn(username)
+        samples.append((time.perf_counter() - start) * 1000)
+
+    print(
+        f"{label:<14} p50={percentile(samples, 50):8.2f}ms  "
+        f"p99={percentile(samples, 99):8.2f}ms  "
+        f"média={statistics.mean(samples):8.2f}ms  n={iterations}"
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara a consulta única e a consulta em duas etapas do perfil público")
+    parser.add_argument("username")
+    parser.add_argument("-n", "--iterations", type=int, default=500)
+    parser.add_argument("-w", "--warmup", type=int, default=20)
+    args = parser.parse_args()
+
+    repo = UserRepository()
+    two_queries = with_cursor(repo._public_profile_two_queries)
+    single_query = with_cursor(repo._public_profile_single_query)
+    if two_queries(args.username) is None:
+        parser.error(f"usuário '{args.username}' não encontrado")
+
+    run("duas consultas", two_queries, args.username, args.iterations, args.warmup)
+    run("consulta única", single_query, args.username, args.iterations, args.warmup)
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,32 @@
+import os
+from dotenv import load_dotenv
+from flask import g
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
+from Utils.rate_limit_storage import MmapStorage, default_uri
+
+load_dotenv()
+
+# Contadores compartilhados por todos os workers da máquina; use memory:// para voltar ao contador
+# por processo (o padrão onde não há fcntl, como no Windows)
+RATELIMIT_STORAGE_URI = os.getenv("RATELIMIT_STORAGE_URI", default_uri("mylinks-ratelimit"))
+
+# Balde por usuário consumido em toda rota autenticada (fichas por segundo / tamanho do balde)
+USER_RATE = float(os.getenv("USER_RATE", 2))
+USER_BURST = int(os.getenv("USER_BURST", 60))
+
+user_buckets = MmapStorage(os.getenv("USER_BUCKETS_URI", default_uri("mylinks-user-buckets")))
+
+def user_or_ip():
+    # token_required já decodificou o JWT; rotas públicas caem no IP
+    usuario_id = g.get("usuario_id")
+    if usuario_id is not None:
+        return f"usuario:{usuario_id}"
+    return get_remote_address()
 
 limiter = Limiter(
-    key_func=get_remote_address,
+    key_func=user_or_ip,
     default_limits=["500 per day", "100 per hour"],
-    storage_uri="memory://",
-    strategy="fixed-window"
+    storage_uri=RATELIMIT_STORAGE_URI,
+    strategy=os.getenv("RATELIMIT_STRATEGY", "sliding-window-counter")
 )
@@ -0,0 +1,164 @@
+import os
+import re
+import tempfile
+from Utils.rate_limit_storage import fcntl
+
+# Topologia completa de produção (primário, réplica e dois shards) com bancos substitutos em
+# SQLite: as URLs abaixo nunca são conectadas, a fixture standins troca os pools antes do uso.
+# Definido antes de qualquer módulo do projeto que lê o ambiente ao ser importado
+_estado = tempfile.mkdtemp(prefix="mylinks-tests-")
+
+def _shared_uri(nome):
+    return f"mmap://{os.path.join(_estado, nome)}" if fcntl is not None else "memory://"
+
+os.environ.update({
+    "DB_BACKEND": "mysql",
+    "CONN_URL": "mysql://standin@127.0.0.1:1/primario",
+    "REPLICA_URL": "mysql://standin@127.0.0.1:1/replica",
+    "SHARD_URLS": "mysql://standin@127.0.0.1:1/shard0,mysql://standin@127.0.0.1:1/shard1",
+    "SHARD_ID_STRIDE": "64",
+    "SHARD_DIRECTORY_TTL": "0",
+    "REPLICA_STICKY_URI": _shared_uri("replica-sticky"),
+    "CACHE_INVALIDATION_URI": _shared_uri("cache-invalidation"),
+    "RATELIMIT_STORAGE_URI": "memory://",
+    "USER_BUCKETS_URI": "memory://",
+    "SECRET_KEY": "chave-dos-testes-com-pelo-menos-32-bytes",
+})
+
+import pytest
+from Utils import db_railway
+from Utils.cache import link_cache, profile_cache
+from Utils.db_sqlite import SQLitePool, _Cursor
+from Utils.shard_router import router
+
+DIRECTORY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS usuarios_diretorio (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username VARCHAR(255) UNIQUE COLLATE NOCASE,
+    email VARCHAR(255) UNIQUE COLLATE NOCASE,
+    shard SMALLINT NOT NULL,
+    movendo TINYINT NOT NULL DEFAULT 0
+);
+"""
+
+class StandInCursor(_Cursor):
+    """
+    Cursor do backend SQLite com o que falta para o SQL do MySQL que só roda com réplica e shards.
+
+    Com ``auto_increment`` (lido do init_command do pool do shard), o próximo id de links segue
+    auto_increment_increment/offset como no MySQL.
+    """
+
+    def __init__(self, conn, dictionary, auto_increment=None):
+        super().__init__(conn, dictionary)
+        self._auto_increment = auto_increment
+
+    def _prepare(self, sql):
+        # Sem trava compartilhada no SQLite: vira a trava de escrita do FOR UPDATE
+        if sql.rstrip().upper().endswith(" LOCK IN SHARE MODE"):
+            sql = sql.rstrip()[:-len(" LOCK IN SHARE MODE")] + " FOR UPDATE"
+        sql = super()._prepare(sql)
+        if self._auto_increment and re.match(r"\s*INSERT (OR IGNORE )?INTO links\b", sql, re.IGNORECASE):
+            self._next_link_id(*self._auto_increment)
+        return sql
+
+    def _next_link_id(self, passo, offset):
+        # Menor offset + k * passo acima do maior id já usado (vale para INSERTs de uma linha)
+        maior = self._conn.execute(
+            "SELECT MAX(id) FROM (SELECT MAX(id) AS id FROM links "
+            "UNION ALL SELECT seq FROM sqlite_sequence WHERE name = 'links')"
+        ).fetchone()[0] or 0
+        proximo = offset + max(0, -(-(maior + 1 - offset) // passo)) * passo
+        self._conn.execute("DELETE FROM sqlite_sequence WHERE name = 'links'")
+        self._conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('links', ?)", (proximo - 1,))
+
+class StandInConnection:
+    """Conexão SQLite com a interface do mysql.connector usada por db_railway."""
+
+    unread_result = False
+
+    def __init__(self, conn, auto_increment=None):
+        self.raw = conn
+        self._auto_increment = auto_increment
+
+    @property
+    def in_transaction(self):
+        return self.raw.in_transaction
+
+    def cursor(self, dictionary=False):
+        return StandInCursor(self.raw, dictionary, self._auto_increment)
+
+    def commit(self):
+        self.raw.commit()
+
+    def rollback(self):
+        self.raw.rollback()
+
+    def consume_results(self):
+        pass
+
+class StandInPool(SQLitePool):
+    """Banco substituto de um pool do MySQL: um arquivo SQLite com o esquema do projeto."""
+
+    def __init__(self, path, extra_schema="", init_command=None):
+        super().__init__(str(path))
+        self.extra_schema = extra_schema
+        self.auto_increment = None
+        if init_command:
+            match = re.search(r"auto_increment_increment = (\d+), auto_increment_offset = (\d+)", init_command)
+            self.auto_increment = (int(match.group(1)), int(match.group(2)))
+
+    def _connect(self):
+        conn = super()._connect()
+        conn.executescript(self.extra_schema)
+        return conn
+
+    def acquire(self):
+        return StandInConnection(super().acquire(), self.auto_increment)
+
+    def release(self, conn, discard=False):
+        super().release(conn.raw, discard)
+
+    def reap(self):
+        pass
+
+    def prefill(self):
+        pass
+
+    def execute(self, sql, params=()):
+        """Consulta direta no banco, fora do código testado (preparar dados e conferir resultados)."""
+        conn = self.acquire()
+        try:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+            if conn.in_transaction:
+                conn.commit()
+            return rows
+        finally:
+            self.release(conn)
+
+@pytest.fixture
+def standins(tmp_path, monkeypatch):
+    """Primário (diretório), réplica e shards de db_railway trocados por bancos SQLite vazios."""
+    primario = StandInPool(tmp_path / "primario.db", DIRECTORY_SCHEMA)
+    replica = StandInPool(tmp_path / "replica.db", DIRECTORY_SCHEMA)
+    # Cada shard com o passo de AUTO_INCREMENT que db_railway configurou para o MySQL
+    shards = [
+        StandInPool(tmp_path / f"shard{shard}.db", init_command=pool.config["init_command"])
+        for shard, pool in enumerate(db_railway.shard_pools)
+    ]
+
+    monkeypatch.setattr(db_railway, "connection_pool", primario)
+    monkeypatch.setattr(db_railway, "replica_pool", replica)
+    # A lista é a mesma importada por storage e shard_router: troca os itens, não a lista
+    originais = db_railway.shard_pools[:]
+    db_railway.shard_pools[:] = shards
+
+    db_railway.recent_writers.reset()
+    router._shards.clear()
+    profile_cache.clear()
+    link_cache.clear()
+
+    yield {"primario": primario, "replica": replica, "shards": shards}
+    db_railway.shard_pools[:] = originais
@@ -0,0 +1,42 @@
+import multiprocessing
+import pytest
+from Utils.cache import TTLCache, mark_changed
+from Utils.rate_limit_storage import ChangeMarks, fcntl
+
+def _mark(uri, key):
+    ChangeMarks(uri).mark(key)
+
+@pytest.mark.skipif(fcntl is None, reason="mmap:// requer fcntl")
+def test_change_marks_are_shared_across_processes(tmp_path):
+    uri = f"mmap://{tmp_path / 'changes'}?slots=1024"
+    marks = ChangeMarks(uri)
+    assert marks.changed_at("usuario:1") == 0
+
+    processo = multiprocessing.get_context("spawn").Process(target=_mark, args=(uri, "usuario:1"))
+    processo.start()
+    processo.join()
+
+    assert processo.exitcode == 0
+    assert marks.changed_at("usuario:1") > 0
+
+def test_colliding_keys_never_lose_a_change():
+    # Um slot só: toda alteração vale para todas as chaves, nenhuma é descartada
+    marks = ChangeMarks("memory://?slots=1")
+    primeira = marks.mark("usuario:1")
+    for usuario_id in range(2, 1000):
+        marks.mark(f"usuario:{usuario_id}")
+
+    assert marks.changed_at("usuario:1") > primeira
+
+def test_cache_drops_entries_read_before_a_change():
+    cache = TTLCache(ttl=60, owner=lambda valor: valor["usuario_id"])
+    cache.set("a", {"usuario_id": 41}, cache.generation())
+    cache.set("b", {"usuario_id": 42}, cache.generation())
+
+    mark_changed(41)
+
+    assert cache.get("a") is None
+    assert cache.get("b") == {"usuario_id": 42}
+    # Lido depois da alteração: volta a valer
+    cache.set("a", {"usuario_id": 41}, cache.generation())
+    assert cache.get("a") == {"usuario_id": 41}
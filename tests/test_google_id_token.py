@@ -0,0 +1,73 @@
+import json
+import time
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jwt.algorithms import RSAAlgorithm
+from Utils import http_client
+from Utils.google_id_token import JWKSCache, verify_id_token
+
+AUDIENCE = "cliente.apps.googleusercontent.com"
+JWKS_URL = "https://jwks.test/certs"
+
+class _Response:
+    headers = {"Cache-Control": "public, max-age=3600"}
+
+    def __init__(self, keys):
+        self._keys = keys
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return {"keys": self._keys}
+
+@pytest.fixture(scope="module")
+def private_key():
+    return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+@pytest.fixture
+def jwks(private_key, monkeypatch):
+    jwk = {**json.loads(RSAAlgorithm.to_jwk(private_key.public_key())), "kid": "chave-1", "use": "sig", "alg": "RS256"}
+    monkeypatch.setattr(http_client, "get", lambda url, **kwargs: _Response([jwk]))
+    return JWKSCache(JWKS_URL)
+
+def _token(private_key, kid="chave-1", **claims):
+    agora = int(time.time())
+    payload = {
+        "iss": "https://accounts.google.com",
+        "aud": AUDIENCE,
+        "sub": "1234567890",
+        "email": "ana@mylinks.test",
+        "email_verified": True,
+        "iat": agora,
+        "exp": agora + 3600,
+        **claims
+    }
+    return jwt.encode(payload, private_key, algorithm="RS256", headers={"kid": kid})
+
+def test_valid_token_is_accepted(private_key, jwks):
+    claims = verify_id_token(_token(private_key), AUDIENCE, jwks=jwks)
+
+    assert claims["sub"] == "1234567890"
+    assert claims["email"] == "ana@mylinks.test"
+
+@pytest.mark.parametrize("claims, erro", [
+    ({"aud": "outro-cliente"}, jwt.InvalidAudienceError),
+    ({"iss": "https://emissor.test"}, jwt.InvalidIssuerError),
+    ({"exp": int(time.time()) - 3600}, jwt.ExpiredSignatureError),
+    ({"email_verified": False}, jwt.InvalidTokenError),
+])
+def test_invalid_claims_are_rejected(private_key, jwks, claims, erro):
+    with pytest.raises(erro):
+        verify_id_token(_token(private_key, **claims), AUDIENCE, jwks=jwks)
+
+def test_unknown_kid_is_rejected(private_key, jwks):
+    with pytest.raises(jwt.InvalidTokenError, match="desconhecida"):
+        verify_id_token(_token(private_key, kid="chave-2"), AUDIENCE, jwks=jwks)
+
+def test_token_signed_by_another_key_is_rejected(jwks):
+    outra = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+    with pytest.raises(jwt.InvalidSignatureError):
+        verify_id_token(_token(outra), AUDIENCE, jwks=jwks)
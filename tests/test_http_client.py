@@ -0,0 +1,36 @@
+import pytest
+import requests
+from Utils import http_client
+from Utils.http_client import CircuitBreaker, CircuitOpenError
+
+@pytest.fixture
+def breaker(monkeypatch):
+    # Circuito já aberto e com o tempo de espera vencido: a próxima requisição é a de teste
+    breaker = CircuitBreaker(failures=1, reset_timeout=0)
+    breaker.record(False)
+    monkeypatch.setattr(http_client, "_hosts", {"api.test": (breaker, http_client.HostStats())})
+    return breaker
+
+def _fail_with(monkeypatch, erro):
+    def session_request(method, url, **kwargs):
+        raise erro
+    monkeypatch.setattr(http_client.session, "request", session_request)
+
+def test_local_error_ends_half_open_trial(breaker, monkeypatch):
+    _fail_with(monkeypatch, ValueError("argumento inválido"))
+
+    with pytest.raises(ValueError):
+        http_client.get("https://api.test/x", retries=0)
+
+    assert breaker.state() == "half-open"
+    assert breaker.allow()
+
+def test_host_failures_open_circuit(monkeypatch):
+    breaker = CircuitBreaker(failures=1, reset_timeout=60)
+    monkeypatch.setattr(http_client, "_hosts", {"api.test": (breaker, http_client.HostStats())})
+    _fail_with(monkeypatch, requests.exceptions.ConnectionError("recusada"))
+
+    with pytest.raises(requests.exceptions.ConnectionError):
+        http_client.get("https://api.test/x", retries=0)
+    with pytest.raises(CircuitOpenError):
+        http_client.get("https://api.test/x", retries=0)
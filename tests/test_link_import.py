@@ -0,0 +1,20 @@
+import json
+from Workers import linkWorker
+from Workers.linkWorker import LinkWorker, TITULO_MAX_LENGTH, URL_MAX_LENGTH
+
+def test_oversized_rows_are_per_row_errors(monkeypatch):
+    lotes = []
+    monkeypatch.setattr(linkWorker.repo, "create_many", lambda usuario_id, lote: lotes.append(lote))
+    linhas = [
+        json.dumps({"titulo": "ok", "url": "https://mylinks.test/ok"}),
+        json.dumps({"titulo": "t" * (TITULO_MAX_LENGTH + 1), "url": "https://mylinks.test/titulo"}),
+        json.dumps({"titulo": "url", "url": "https://mylinks.test/" + "u" * URL_MAX_LENGTH}),
+        json.dumps({"titulo": "t" * TITULO_MAX_LENGTH, "url": "https://mylinks.test/limite"}),
+    ]
+
+    resultado = LinkWorker().import_links(1, "ndjson", linhas)
+
+    assert resultado["importados"] == 2
+    assert resultado["ignorados"] == 2
+    assert [erro["linha"] for erro in resultado["erros"]] == [2, 3]
+    assert [link["url"] for link in lotes[0]] == ["https://mylinks.test/ok", "https://mylinks.test/limite"]
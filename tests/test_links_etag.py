@@ -0,0 +1,55 @@
+import pytest
+from flask import Flask
+from Controllers import linkController
+from Controllers.linkController import link_bp
+from Repositories.linkRepository import LinkRepository
+from Utils.auth import ACCESS_TOKEN_TTL, create_token
+from Utils.db_railway import init_unit_of_work
+from extensions import limiter
+
+@pytest.fixture
+def client(standins, monkeypatch):
+    app = Flask(__name__)
+    limiter.init_app(app)
+    init_unit_of_work(app)
+    app.register_blueprint(link_bp)
+
+    standins["shards"][0].execute(
+        "INSERT INTO usuarios (id, username, email, senha, versao) VALUES (1, 'ana', 'ana@mylinks.test', 'hash', 3)"
+    )
+    for n in range(3):
+        LinkRepository().create(1, f"Link {n}", f"https://ana.test/{n}")
+
+    cliente = app.test_client()
+    cliente.environ_base["HTTP_AUTHORIZATION"] = f"Bearer {create_token(1, 'access', ACCESS_TOKEN_TTL)}"
+    return cliente
+
+def test_list_carries_version_without_extra_query(client, monkeypatch):
+    def get_version(usuario_id):
+        raise AssertionError("consulta de versão sem If-None-Match")
+    monkeypatch.setattr(linkController.worker, "get_version", get_version)
+
+    resposta = client.get("/links")
+    assert resposta.status_code == 200
+    assert [link["titulo"] for link in resposta.get_json()] == ["Link 0", "Link 1", "Link 2"]
+    # Três criações a partir da versão 3
+    assert resposta.headers["ETag"] == '"1-6"'
+
+    pagina = client.get("/links?limit=2")
+    assert pagina.headers["ETag"] == '"1-6"'
+    assert len(pagina.get_json()["links"]) == 2
+    assert "versao" not in pagina.get_json()
+
+    resto = client.get(f"/links?limit=2&cursor={pagina.get_json()['next_cursor']}")
+    assert [link["titulo"] for link in resto.get_json()["links"]] == ["Link 2"]
+    assert resto.get_json()["next_cursor"] is None
+
+def test_matching_etag_is_not_modified(client):
+    etag = client.get("/links").headers["ETag"]
+
+    assert client.get("/links", headers={"If-None-Match": etag}).status_code == 304
+
+    LinkRepository().create(1, "Novo", "https://ana.test/novo")
+    resposta = client.get("/links", headers={"If-None-Match": etag})
+    assert resposta.status_code == 200
+    assert resposta.headers["ETag"] != etag
@@ -0,0 +1,45 @@
+import multiprocessing
+import pytest
+from Utils.rate_limit_storage import MmapStorage, fcntl
+
+pytestmark = pytest.mark.skipif(fcntl is None, reason="mmap:// requer fcntl")
+
+PROCESSOS = 4
+TENTATIVAS = 50
+LIMITE = 60
+
+def _sliding_window(uri):
+    storage = MmapStorage(uri)
+    # Janela de um dia: o teste não atravessa a virada entre duas janelas
+    return sum(storage.acquire_sliding_window_entry("ip:1", LIMITE, 86400) for _ in range(TENTATIVAS))
+
+def _token_bucket(uri):
+    storage = MmapStorage(uri)
+    # Reposição desprezível: só as fichas do balde cheio podem ser consumidas
+    return sum(storage.acquire_token("usuario:1", 1e-9, LIMITE) == 0 for _ in range(TENTATIVAS))
+
+def _run(fn, uri):
+    # Processos novos (sem fork): cada um abre e mapeia o arquivo por conta própria, como os workers
+    with multiprocessing.get_context("spawn").Pool(PROCESSOS) as pool:
+        return pool.map(fn, [uri] * PROCESSOS)
+
+@pytest.fixture
+def uri(tmp_path):
+    return f"mmap://{tmp_path / 'ratelimit'}?slots=1024"
+
+def test_sliding_window_counts_all_processes(uri):
+    permitidas = _run(_sliding_window, uri)
+
+    assert sum(permitidas) == LIMITE
+    assert not MmapStorage(uri).acquire_sliding_window_entry("ip:1", LIMITE, 86400)
+
+def test_token_bucket_counts_all_processes(uri):
+    permitidas = _run(_token_bucket, uri)
+
+    assert sum(permitidas) == LIMITE
+    assert MmapStorage(uri).acquire_token("usuario:1", 1e-9, LIMITE) > 0
+
+def test_keys_are_independent(uri):
+    _run(_token_bucket, uri)
+
+    assert MmapStorage(uri).acquire_token("usuario:2", 1e-9, LIMITE) == 0
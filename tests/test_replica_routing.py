@@ -0,0 +1,68 @@
+import multiprocessing
+import pytest
+from Repositories.directoryRepository import DirectoryRepository
+from Utils.db_railway import get_read_cursor, mark_written, wrote_recently
+from Utils.rate_limit_storage import fcntl
+
+def _register(standins, usuario_id, username):
+    # A réplica ficou para trás: ainda aponta o shard 0, o primário já tem o shard 1.
+    # O shard lido diz de qual banco veio a resposta
+    for banco, shard in (("primario", 1), ("replica", 0)):
+        standins[banco].execute(
+            "INSERT INTO usuarios_diretorio (id, username, email, shard) VALUES (%s, %s, %s, %s)",
+            (usuario_id, username, f"{username}@mylinks.test", shard)
+        )
+
+def _read_shard(usuario_id):
+    with get_read_cursor(usuario_id=usuario_id) as cursor:
+        cursor.execute("SELECT shard FROM usuarios_diretorio WHERE id = %s", (usuario_id,))
+        return cursor.fetchone()["shard"]
+
+def test_reads_go_to_replica(standins):
+    _register(standins, 1, "ana")
+
+    assert DirectoryRepository().get(1)["shard"] == 0
+    assert DirectoryRepository().find("username", "ana")["shard"] == 0
+    assert _read_shard(1) == 0
+
+def test_writes_go_to_primary(standins):
+    _register(standins, 1, "ana")
+
+    DirectoryRepository().update(1, "username", "ana_nova")
+
+    assert standins["primario"].execute("SELECT username FROM usuarios_diretorio WHERE id = 1") == [{"username": "ana_nova"}]
+    assert standins["replica"].execute("SELECT username FROM usuarios_diretorio WHERE id = 1") == [{"username": "ana"}]
+
+def test_reads_missing_on_replica_fall_back_to_primary(standins):
+    standins["primario"].execute(
+        "INSERT INTO usuarios_diretorio (id, username, email, shard) VALUES (7, 'recente', 'recente@mylinks.test', 1)"
+    )
+
+    assert DirectoryRepository().find("username", "recente")["shard"] == 1
+
+def test_reads_stick_to_primary_after_write(standins):
+    _register(standins, 1, "ana")
+    _register(standins, 2, "bia")
+
+    mark_written(1)
+
+    assert DirectoryRepository().get(1)["shard"] == 1
+    assert DirectoryRepository().find("username", "ana")["shard"] == 1
+    assert _read_shard(1) == 1
+    # Só quem escreveu sai da réplica
+    assert DirectoryRepository().get(2)["shard"] == 0
+    assert _read_shard(2) == 0
+
+@pytest.mark.skipif(fcntl is None, reason="sem fcntl a marca fica no processo (memory://)")
+def test_stickiness_is_shared_across_processes(standins):
+    _register(standins, 1, "ana")
+
+    # Outro worker atendeu a escrita: a marca chega por recent_writers (REPLICA_STICKY_URI)
+    processo = multiprocessing.get_context("spawn").Process(target=mark_written, args=(1,))
+    processo.start()
+    processo.join()
+
+    assert processo.exitcode == 0
+    assert wrote_recently(1)
+    assert DirectoryRepository().get(1)["shard"] == 1
+    assert _read_shard(1) == 1
@@ -0,0 +1,48 @@
+import threading
+from datetime import timedelta
+import pytest
+from werkzeug.exceptions import ServiceUnavailable
+from Utils import revocation
+from Utils.revocation import RevocationList
+
+@pytest.fixture
+def token_repo(monkeypatch):
+    monkeypatch.setattr(revocation, "every", lambda *args: None)
+    return revocation.repo
+
+def test_threads_wait_for_the_initial_load(token_repo, monkeypatch):
+    carregando = threading.Event()
+    liberar = threading.Event()
+
+    def list_since(ultimo_id, agora):
+        carregando.set()
+        liberar.wait(5)
+        return [{"id": 1, "jti": "revogado", "expira_em": agora + timedelta(hours=1)}]
+
+    monkeypatch.setattr(token_repo, "list_since", list_since)
+    lista = RevocationList()
+    resultados = []
+    primeira = threading.Thread(target=lambda: resultados.append(lista.is_revoked("revogado", 1)))
+    primeira.start()
+    carregando.wait(5)
+
+    # Chega durante a carga: espera por ela em vez de consultar a lista vazia
+    segunda = threading.Thread(target=lambda: resultados.append(lista.is_revoked("revogado", 1)))
+    segunda.start()
+    segunda.join(0.2)
+    assert segunda.is_alive()
+
+    liberar.set()
+    primeira.join(5)
+    segunda.join(5)
+    assert resultados == [True, True]
+
+def test_failed_initial_load_is_retried(token_repo, monkeypatch):
+    respostas = [None, []]
+    monkeypatch.setattr(token_repo, "list_since", lambda ultimo_id, agora: respostas.pop(0))
+    lista = RevocationList()
+
+    with pytest.raises(ServiceUnavailable):
+        lista.is_revoked("qualquer", 1)
+    assert lista.is_revoked("qualquer", 1) is False
+    assert respostas == []
@@ -0,0 +1,113 @@
+from datetime import date, datetime
+import pytest
+from Repositories.directoryRepository import DirectoryRepository
+from Repositories.linkRepository import LinkRepository
+from Repositories.userRepository import UserRepository
+from Utils import shard_router
+from Utils.db_railway import SHARD_ID_STRIDE
+from Utils.shard_router import UserMovingError, router
+from tools.move_user import USER_TABLES, count_user_rows, move_user
+
+def _create_user(monkeypatch, username, shard):
+    # Novos cadastros só no shard pedido
+    monkeypatch.setattr(shard_router, "SHARD_NEW_USERS", [shard])
+    user = UserRepository().create(username, f"{username}@mylinks.test", "hash")
+    assert user
+    return user.id
+
+def _record_clicks(standins, shard, usuario_id, link_id):
+    banco = standins["shards"][shard]
+    banco.execute("INSERT INTO link_cliques (link_id, total) VALUES (%s, 3)", (link_id,))
+    banco.execute(
+        "INSERT INTO link_cliques_hora (link_id, usuario_id, hora, total) VALUES (%s, %s, %s, 3)",
+        (link_id, usuario_id, datetime(2026, 10, 1, 12))
+    )
+    banco.execute(
+        "INSERT INTO link_cliques_dia (link_id, usuario_id, dia, total) VALUES (%s, %s, %s, 3)",
+        (link_id, usuario_id, date(2026, 10, 1))
+    )
+
+def test_users_live_on_the_shard_in_the_directory(standins, monkeypatch):
+    ana = _create_user(monkeypatch, "ana", 0)
+    bia = _create_user(monkeypatch, "bia", 1)
+
+    assert router.shard_for_user(ana) == 0
+    assert router.shard_for_user(bia) == 1
+    assert router.locate("username", "bia") == 1
+    assert router.locate("email", "ana@mylinks.test") == 0
+
+    # A linha do usuário existe só no shard dele; o diretório fica no primário
+    assert standins["shards"][1].execute("SELECT username FROM usuarios") == [{"username": "bia"}]
+    assert standins["shards"][0].execute("SELECT username FROM usuarios") == [{"username": "ana"}]
+    assert [row["username"] for row in standins["primario"].execute(
+        "SELECT username FROM usuarios_diretorio ORDER BY id"
+    )] == ["ana", "bia"]
+
+    assert UserRepository().get_public_profile("bia")["id"] == bia
+
+def test_link_ids_are_interleaved_by_shard(standins, monkeypatch):
+    repo = LinkRepository()
+    links = {}
+    for shard, username in enumerate(["ana", "bia"]):
+        usuario_id = _create_user(monkeypatch, username, shard)
+        links[shard] = [repo.create(usuario_id, f"Link {n}", f"https://{username}.test/{n}") for n in range(3)]
+
+    for shard, criados in links.items():
+        # O shard i gera ids ≡ i + 1 (mod SHARD_ID_STRIDE)
+        assert all((link.id - 1) % SHARD_ID_STRIDE == shard for link in criados)
+        for link in criados:
+            assert router.link_shard_candidates(link.id)[0] == shard
+            assert repo.find_public(link.id)["url"] == link.url
+
+    ids = [link.id for criados in links.values() for link in criados]
+    assert len(set(ids)) == len(ids)
+
+def test_move_user_copies_links_and_clicks(standins, monkeypatch):
+    ana = _create_user(monkeypatch, "ana", 0)
+    repo = LinkRepository()
+    links = [repo.create(ana, f"Link {n}", f"https://ana.test/{n}") for n in range(2)]
+    for link in links:
+        _record_clicks(standins, 0, ana, link.id)
+    standins["shards"][0].execute(
+        "INSERT INTO perfil_visitantes (usuario_id, dia, sketch) VALUES (%s, %s, %s)",
+        (ana, date(2026, 10, 1), b"\x01" * 16)
+    )
+    antes = count_user_rows(ana, 0)
+    assert all(antes[tabela] for tabela, _ in USER_TABLES)
+
+    move_user(ana, 1, grace=0)
+
+    assert count_user_rows(ana, 1) == antes
+    assert all(total == 0 for total in count_user_rows(ana, 0).values())
+    assert DirectoryRepository().get(ana) == {"id": ana, "shard": 1, "movendo": 0}
+    assert router.shard_for_user(ana) == 1
+
+    # Os ids nascidos no shard 0 continuam valendo: /l/{id} acha o link no shard novo
+    for link in links:
+        assert repo.find_public(link.id)["url"] == link.url
+
+    # E os próximos ids do shard 1 não colidem com os copiados
+    novo = repo.create(ana, "Novo", "https://ana.test/novo")
+    assert (novo.id - 1) % SHARD_ID_STRIDE == 1
+    assert novo.id not in [link.id for link in links]
+    assert [link.id for link in repo.getAll(ana)[0]] == [link.id for link in links] + [novo.id]
+
+def test_writes_wait_while_user_is_moving(standins, monkeypatch):
+    ana = _create_user(monkeypatch, "ana", 0)
+    directory = DirectoryRepository()
+
+    assert directory.begin_move(ana, 0)
+    with pytest.raises(UserMovingError):
+        router.shard_for_write(ana)
+    # Leituras seguem na origem
+    assert router.shard_for_user(ana) == 0
+
+    directory.finish_move(ana, 0)
+    assert router.shard_for_write(ana) == 0
+
+def test_locate_unknown_values(standins, monkeypatch):
+    _create_user(monkeypatch, "ana", 0)
+
+    assert router.locate("username", "ninguem") is None
+    assert router.locate("email", "ninguem@mylinks.test") is None
+    assert UserRepository().get_public_profile("ninguem") is None
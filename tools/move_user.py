@@ -0,0 +1,102 @@
+import argparse
+import time
+from Repositories.directoryRepository import DirectoryRepository
+from Utils.db_railway import SHARDED, get_db_cursor, shard_pools
+from Utils.shard_router import SHARD_DIRECTORY_TTL
+
+# Tabelas com dados do usuário, na ordem das chaves estrangeiras
+USER_TABLES = [
+    ("usuarios", "id = %s"),
+    ("links", "usuario_id = %s"),
+    ("link_cliques", "link_id IN (SELECT id FROM links WHERE usuario_id = %s)"),
+    ("link_cliques_hora", "usuario_id = %s"),
+    ("link_cliques_dia", "usuario_id = %s"),
+    ("perfil_visitantes", "usuario_id = %s"),
+]
+
+def delete_user_rows(usuario_id, shard):
+    # ON DELETE CASCADE leva links, cliques e visitantes junto
+    with get_db_cursor(shard=shard) as cursor:
+        cursor.execute("DELETE FROM usuarios WHERE id = %s", (usuario_id,))
+
+def copy_user(usuario_id, origem, destino):
+    copiadas = {}
+    with get_db_cursor(shard=origem) as leitura, get_db_cursor(shard=destino) as escrita:
+        # Restos de uma migração interrompida
+        escrita.execute("DELETE FROM usuarios WHERE id = %s", (usuario_id,))
+
+        for tabela, filtro in USER_TABLES:
+            leitura.execute(f"SELECT * FROM {tabela} WHERE {filtro}", (usuario_id,))
+            rows = leitura.fetchall()
+            copiadas[tabela] = len(rows)
+            if not rows:
+                continue
+
+            colunas = list(rows[0])
+            escrita.executemany(
+                f"INSERT INTO {tabela} ({', '.join(colunas)}) VALUES ({', '.join(['%s'] * len(colunas))})",
+                [tuple(row[coluna] for coluna in colunas) for row in rows]
+            )
+    return copiadas
+
+def count_user_rows(usuario_id, shard):
+    with get_db_cursor(shard=shard) as cursor:
+        contagens = {}
+        for tabela, filtro in USER_TABLES:
+            cursor.execute(f"SELECT COUNT(*) AS total FROM {tabela} WHERE {filtro}", (usuario_id,))
+            contagens[tabela] = cursor.fetchone()["total"]
+        return contagens
+
+def move_user(usuario_id, destino, grace, directory=None):
+    directory = directory or DirectoryRepository()
+
+    row = directory.get_for_write(usuario_id)
+    if row is None:
+        raise SystemExit(f"usuário {usuario_id} não está no diretório")
+    origem = row["shard"]
+    if origem == destino:
+        raise SystemExit(f"usuário {usuario_id} já está no shard {destino}")
+
+    # Espera as escritas em curso (trava compartilhada) e bloqueia as novas com UserMovingError
+    if not directory.begin_move(usuario_id, origem):
+        raise SystemExit(f"usuário {usuario_id} já está sendo migrado")
+    print(f"usuário {usuario_id}: shard {origem} -> {destino}, escritas bloqueadas")
+
+    try:
+        # Gravações em lote (cliques, visitantes) que já leram o diretório antes do bloqueio
+        time.sleep(grace)
+        copiadas = copy_user(usuario_id, origem, destino)
+        conferidas = count_user_rows(usuario_id, destino)
+        if conferidas != copiadas:
+            raise RuntimeError(f"contagens divergentes: copiadas {copiadas}, no destino {conferidas}")
+    except BaseException:
+        directory.finish_move(usuario_id, origem)
+        delete_user_rows(usuario_id, destino)
+        print(f"usuário {usuario_id}: migração desfeita, continua no shard {origem}")
+        raise
+
+    directory.finish_move(usuario_id, destino)
+    print(f"usuário {usuario_id}: copiado ({copiadas}), escritas liberadas no shard {destino}")
+
+    # Workers ainda podem ler da origem pelo cache do diretório até SHARD_DIRECTORY_TTL
+    time.sleep(SHARD_DIRECTORY_TTL + grace)
+    delete_user_rows(usuario_id, origem)
+    print(f"usuário {usuario_id}: dados removidos do shard {origem}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Move os dados de um usuário para outro shard sem tirar a API do ar")
+    parser.add_argument("usuario_id", type=int)
+    parser.add_argument("destino", type=int, help="índice do shard em SHARD_URLS")
+    parser.add_argument("-g", "--grace", type=float, default=5,
+                        help="segundos de espera por gravações em lote antes de copiar")
+    args = parser.parse_args()
+
+    if not SHARDED:
+        parser.error("SHARD_URLS não configurado")
+    if not 0 <= args.destino < len(shard_pools):
+        parser.error(f"shard {args.destino} não existe (0 a {len(shard_pools) - 1})")
+
+    move_user(args.usuario_id, args.destino, args.grace)
+
+if __name__ == "__main__":
+    main()